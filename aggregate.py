@@ -0,0 +1,101 @@
+'''
+Running sentiment aggregates, updated as each tweet is analyzed
+'''
+import re
+import time
+import calendar
+import threading
+import collections
+
+# created_at as the Twitter API formats it
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+HASHTAG_PATTERN = re.compile(r'(?<!\w)#(\w+)', re.U)
+
+
+def created_at_epoch(created_at):
+    ''' Seconds since the epoch of a created_at timestamp, None if it
+    can not be read
+    '''
+    try:
+        return calendar.timegm(time.strptime(created_at, CREATED_AT_FORMAT))
+    except (TypeError, ValueError):
+        return None
+
+
+def hashtags(tweet):
+    ''' The lowercased hashtags of a tweet, from its entities when the API
+    sent them, else from its text
+    '''
+    entities = tweet.get('entities')
+    if entities and 'hashtags' in entities:
+        tags = [tag['text'] for tag in entities['hashtags']]
+    else:
+        tags = HASHTAG_PATTERN.findall(tweet.get('text') or '')
+    return set(tag.lower() for tag in tags)
+
+
+class Stats(object):
+    ''' Count, sum and per-label histogram of sentiment values '''
+
+    __slots__ = ('count', 'total', 'labels')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.labels = collections.Counter()
+
+    def add(self, label, value):
+        self.count += 1
+        self.total += value
+        self.labels[label] += 1
+
+    @property
+    def mean(self):
+        return float(self.total) / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.mean,
+                'labels': dict(self.labels)}
+
+
+class SentimentAggregator(object):
+    ''' Sentiment of the tweets analyzed so far: overall, per time window
+    of window seconds (from created_at), per hashtag and per query.
+
+    Each add() touches a handful of Stats, whatever the number of tweets
+    seen before. snapshot() can be called from another thread while a run
+    is going on.
+    '''
+
+    def __init__(self, window=3600):
+        self.window = window
+        self.lock = threading.Lock()
+        self.overall = Stats()
+        self.windows = collections.defaultdict(Stats)
+        self.hashtags = collections.defaultdict(Stats)
+        self.queries = collections.defaultdict(Stats)
+
+    def add(self, tweet, label, value, query=None):
+        epoch = created_at_epoch(tweet.get('created_at'))
+        tags = hashtags(tweet)
+        with self.lock:
+            self.overall.add(label, value)
+            if epoch is not None:
+                self.windows[epoch - epoch % self.window].add(label, value)
+            for tag in tags:
+                self.hashtags[tag].add(label, value)
+            if query is not None:
+                self.queries[query].add(label, value)
+
+    def snapshot(self):
+        ''' The aggregates as plain dicts, windows keyed on their start '''
+        with self.lock:
+            return {
+                'overall': self.overall.as_dict(),
+                'windows': dict((start, stats.as_dict())
+                                for start, stats in self.windows.iteritems()),
+                'hashtags': dict((tag, stats.as_dict())
+                                 for tag, stats in self.hashtags.iteritems()),
+                'queries': dict((query, stats.as_dict())
+                                for query, stats in self.queries.iteritems()),
+            }
@@ -9,5 +9,27 @@ __version__ = '1.0.3'
 __author__ = 'Hiroyoshi Komatsu'
 __license__ = 'GNU v2+'
 
-# classes
-from .corenlp import StanfordCoreNLP, ParserError, TimeoutError, ProcessError
+import sys
+import types
+
+# classes, imported from corenlp the first time one is asked for: clients
+# only need metrics, cache and faults, without pexpect and the server
+__all__ = ['StanfordCoreNLP', 'StanfordCoreNLPPool', 'ParserError', 'TimeoutError',
+           'ProcessError', 'ServerBusyError']
+
+
+class _Package(types.ModuleType):
+
+    def __getattr__(self, name):
+        if name not in self.__all__:
+            raise AttributeError(name)
+        corenlp = __import__(self.__name__ + '.corenlp', fromlist=[name])
+        return getattr(corenlp, name)
+
+
+_package = _Package(__name__, __doc__)
+_package.__dict__.update(dict((key, value) for key, value in globals().iteritems()
+                              if key != '_package'))
+# keeps this module, whose globals Python 2 clears once it is dropped
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
@@ -0,0 +1,96 @@
+"""
+Two-tier cache of parse results, keyed on the text sent to CoreNLP
+"""
+import json
+import hashlib
+import sqlite3
+import threading
+import collections
+
+
+def properties_digest(path):
+    """ Hash of a CoreNLP properties file, results depend on its contents """
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class ResultCache(object):
+
+    """
+    A size-bounded LRU in memory, in front of an optional SQLite table that
+    survives restarts.
+
+    Keys are the SHA-1 of the namespace (the properties digest), the kind
+    of result (full parse or labels only) and the text, so results parsed with
+    other annotators, or shaped differently, never get mixed up.
+    Safe to share between the threads of the RPC server.
+    """
+
+    def __init__(self, capacity=10000, path=None, namespace=''):
+        self.capacity = capacity
+        self.namespace = namespace
+        self.memory = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)')
+            self.db.commit()
+
+    def key(self, text, kind=''):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return hashlib.sha1('\0'.join((self.namespace, kind, text))).hexdigest()
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        if len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, text, kind=''):
+        """ The cached result for text, None on a miss """
+        key = self.key(text, kind)
+        with self.lock:
+            if key in self.memory:
+                value = self.memory.pop(key)
+                self.memory[key] = value
+                self.hits += 1
+                return value
+            if self.db is not None:
+                row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    if self.capacity:
+                        self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, text, value, kind=''):
+        key = self.key(text, kind)
+        with self.lock:
+            if self.capacity:
+                self.memory.pop(key, None)
+                self._remember(key, value)
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)',
+                                (key, json.dumps(value)))
+                self.db.commit()
+
+    def stats(self):
+        """ Counters to tune the capacity with """
+        with self.lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self.memory), 'capacity': self.capacity}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -1,5 +1,4 @@
 import json
-import optparse
 import os
 import re
 import sys
@@ -7,12 +6,31 @@ import glob
 import pexpect
 import tempfile
 import shutil
+import collections
+import time
+import threading
+import itertools
+import Queue
+import SocketServer
+import traceback
+import jsonrpclib
+from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer, SimpleJSONRPCRequestHandler, validate_request
 from progressbar import ProgressBar, Fraction
-from subprocess import call
+from cache import ResultCache, properties_digest
+from metrics import METRICS
+from faults import SERVER_BUSY
 
 VERBOSE = False
 STATE_START, STATE_TEXT, STATE_WORDS, STATE_TREE, STATE_DEPENDENCY, STATE_COREFERENCE = 0, 1, 2, 3, 4, 5
 WORD_PATTERN = re.compile('\[([^\]]+)\]')
+SENTIMENT_PATTERN = re.compile(r"^Sentence #\d+ \(.*sentiment: ([^)\r\n]*)\):", re.M)
+PROMPT = "\nNLP> "
+OOM_WARNING = "\nWARNING: Parsing of sentence failed, possibly because of out of memory."
+# bytes kept in flight during a batch, below the 4095 byte pty line buffer
+BATCH_WINDOW = 4000
+# what health probes send, and how long the shell has to answer it
+PROBE_TEXT = "ok"
+PROBE_TIMEOUT = 30.0
 CR_PATTERN = re.compile(r"\((\d*),(\d*),\[(\d*),(\d*)\]\) -> \((\d*),(\d*),\[(\d*),(\d*)\]\), that is: \"(.*)\" -> \"(.*)\"")
 
 if os.environ.has_key("CORENLP"):
@@ -47,6 +65,15 @@ class ParserError(Exception):
         return repr(self.value)
 
 
+class ServerBusyError(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
 class TimeoutError(Exception):
 
     def __init__(self, value):
@@ -65,6 +92,18 @@ class OutOfMemoryError(Exception):
         return repr(self.value)
 
 
+def locate_properties(properties):
+    """
+    Finds a properties file, as given or next to this module.
+    """
+    current_dir_pr = os.path.dirname(os.path.abspath(__file__)) + "/" + properties
+    if os.path.exists(properties):
+        return properties
+    elif os.path.exists(current_dir_pr):
+        return current_dir_pr
+    raise Exception("Error! Cannot locate: %s" % properties)
+
+
 def init_corenlp_command(corenlp_path, memory, properties):
     """
     Checks the location of the jar files.
@@ -90,13 +129,7 @@ def init_corenlp_command(corenlp_path, memory, properties):
 
     # include the properties file, so you can change defaults
     # but any changes in output format will break parse_parser_results()
-    current_dir_pr = os.path.dirname(os.path.abspath(__file__)) + "/" + properties
-    if os.path.exists(properties):
-        props = "-props %s" % (properties)
-    elif os.path.exists(current_dir_pr):
-        props = "-props %s" % (current_dir_pr)
-    else:
-        raise Exception("Error! Cannot locate: %s" % properties)
+    props = "-props %s" % locate_properties(properties)
 
     # add and check classpaths
     jars = [corenlp_path + "/" + jar for jar in jars]
@@ -115,6 +148,54 @@ def init_corenlp_command(corenlp_path, memory, properties):
     return "%s %s -cp %s %s %s" % (java_path, limit, ':'.join(jars), classname, props)
 
 
+class LazyToken(object):
+
+    """
+    A parsed word that only splits its attributes when they are read.
+
+    Behaves like the (word, attrs) tuple parse_bracketed() returns, for
+    callers that look at few of the words they get. Not JSON serializable,
+    for in-process use only.
+    """
+
+    __slots__ = ('raw', '_parsed')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._parsed = None
+
+    def _parse(self):
+        if self._parsed is None:
+            self._parsed = parse_bracketed(self.raw)
+        return self._parsed
+
+    @property
+    def word(self):
+        return self._parse()[0]
+
+    @property
+    def attrs(self):
+        return self._parse()[1]
+
+    def __getitem__(self, i):
+        return self._parse()[i]
+
+    def __iter__(self):
+        return iter(self._parse())
+
+    def __len__(self):
+        return 2
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'LazyToken(%r)' % self.raw
+
+
 def remove_id(word):
     """Removes the numeric suffix from the parsed recognized words: e.g. 'word-2' > 'word' """
     return word.count("-") == 0 and word or word[0:word.rindex("-")]
@@ -124,6 +205,18 @@ def parse_bracketed(s):
     '''Parse word features [abc=... def = ...]
     Also manages to parse out features that have XML within them
     '''
+    # plain key=value pairs, which is nearly every token: split instead of
+    # running the regexes, a pair without exactly one '=' raises ValueError
+    if '<' not in s:
+        try:
+            attrs = dict([pair.split('=') for pair in s.split()])
+        except ValueError:
+            return _parse_bracketed(s)
+        return (attrs.pop('Text', None), attrs)
+    return _parse_bracketed(s)
+
+
+def _parse_bracketed(s):
     word = None
     attrs = {}
     temp = {}
@@ -142,53 +235,107 @@ def parse_bracketed(s):
     return (word, attrs)
 
 
-def parse_parser_results(text):
-    """ This is the nasty bit of code to interact with the command-line
-    interface of the CoreNLP tools.  Takes a string of the parser results
+class ResultsParser:
 
-    and then returns a Python list of dictionaries, one for each parsed
-    sentence.
+    """ This is the nasty bit of code to interact with the command-line
+    interface of the CoreNLP tools, as a state machine fed with the
+    shell output chunk by chunk, as it is read.
+
+    feed() returns the sentences whose block was closed by that chunk, so
+    they can be used before the shell is done with the whole text, and
+    no full copy of the output is ever held. results ends up as the
+    dictionary parse_parser_results() returns, or with sentiment_only as
+    the list of labels parse_sentiment_results() returns. With lazy, the
+    words are LazyToken instead of (word, attrs) tuples.
     """
-    results = {"sentences": []}
-    state = STATE_START
-
-    if sys.version_info[0] < 3 and isinstance(text, str) or \
-            sys.version_info[0] >= 3 and isinstance(text, bytes):
-        text = text.decode('utf-8')
 
-    for line in text.split('\n'):
-        line = line.strip()
+    def __init__(self, sentiment_only=False, lazy=False):
+        self.sentiment_only = sentiment_only
+        self.lazy = lazy
+        if sentiment_only:
+            self.results = []
+        else:
+            self.results = {"sentences": []}
+        self.state = STATE_START
+        self.sentence = None
+        self.coref_set = None
+        self.partial = ''
+
+    def feed(self, chunk):
+        """ Parses the complete lines of chunk, the rest waits for the next """
+        data = self.partial + chunk
+        end = data.rfind('\n') + 1
+        self.partial = data[end:]
+        if not end:
+            return []
+
+        if self.sentiment_only:
+            labels = SENTIMENT_PATTERN.findall(data, 0, end)
+            self.results.extend(labels)
+            return labels
+
+        data = data[:end]
+        if sys.version_info[0] < 3 and isinstance(data, str) or \
+                sys.version_info[0] >= 3 and isinstance(data, bytes):
+            data = data.decode('utf-8')
+        done = []
+        for line in data.split('\n')[:-1]:
+            self._parse_line(line.strip(), done)
+        return done
+
+    def close(self):
+        """ Parses what is left and returns the sentences it finished """
+        # like split('\n') would, the text after the last newline is a
+        # line of its own, even when empty
+        done = self.feed(self.partial + '\n')
+        if self.sentence is not None:
+            done.append(self.sentence)
+            self.sentence = None
+        return done
+
+    def _parse_line(self, line, done):
+        state = self.state
+        sentence = self.sentence
 
         if line.startswith("Sentence #"):
+            if sentence is not None:
+                done.append(sentence)
             index = line.index("sentiment: ")
             length = len("sentiment: ")
             sentiment = line[(index+length): -2]
             sentence = {'sentiment': [], 'words': [], 'parsetree': [], 'dependencies': [], 'indexeddependencies': []}
             sentence['sentiment'] = sentiment
-            results["sentences"].append(sentence)
-            state = STATE_TEXT
+            self.results["sentences"].append(sentence)
+            self.sentence = sentence
+            self.state = STATE_TEXT
 
         elif state == STATE_TEXT:
             sentence['text'] = line
-            state = STATE_WORDS
+            self.state = STATE_WORDS
 
         elif state == STATE_WORDS:
             if not line.startswith("[Text="):
                 raise ParserError('Parse error. Could not find "[Text=" in: %s' % line)
-            for s in WORD_PATTERN.findall(line):
-                sentence['words'].append(parse_bracketed(s))
-            state = STATE_TREE
+            if self.lazy:
+                sentence['words'].extend(map(LazyToken, WORD_PATTERN.findall(line)))
+            else:
+                sentence['words'].extend(map(parse_bracketed, WORD_PATTERN.findall(line)))
+            self.state = STATE_TREE
 
         elif state == STATE_TREE:
             if len(line) == 0:
-                state = STATE_DEPENDENCY
+                self.state = STATE_DEPENDENCY
                 sentence['parsetree'] = " ".join(sentence['parsetree'])
             else:
                 sentence['parsetree'].append(line)
 
         elif state == STATE_DEPENDENCY:
             if len(line) == 0:
-                state = STATE_COREFERENCE
+                self.state = STATE_COREFERENCE
+                # the dependencies close the sentence block
+                if sentence is not None:
+                    done.append(sentence)
+                    self.sentence = None
             else:
                 split_entry = re.split("\(|, ", line[:-1])
                 if len(split_entry) == 3:
@@ -198,67 +345,220 @@ def parse_parser_results(text):
 
         elif state == STATE_COREFERENCE:
             if "Coreference set" in line:
-                if 'coref' not in results:
-                    results['coref'] = []
-                coref_set = []
-                results['coref'].append(coref_set)
+                if 'coref' not in self.results:
+                    self.results['coref'] = []
+                self.coref_set = []
+                self.results['coref'].append(self.coref_set)
             else:
                 for src_i, src_pos, src_l, src_r, sink_i, sink_pos, sink_l, sink_r, src_word, sink_word in CR_PATTERN.findall(line):
                     src_i, src_pos, src_l, src_r = int(src_i) - 1, int(src_pos) - 1, int(src_l) - 1, int(src_r) - 1
                     sink_i, sink_pos, sink_l, sink_r = int(sink_i) - 1, int(sink_pos) - 1, int(sink_l) - 1, int(sink_r) - 1
-                    coref_set.append(((src_word, src_i, src_pos, src_l, src_r), (sink_word, sink_i, sink_pos, sink_l, sink_r)))
+                    self.coref_set.append(((src_word, src_i, src_pos, src_l, src_r), (sink_word, sink_i, sink_pos, sink_l, sink_r)))
+
+
+def parse_parser_results(text, lazy=False):
+    """ Takes a string of the parser results and then returns a Python
+    list of dictionaries, one for each parsed sentence.
+    """
+    parser = ResultsParser(lazy=lazy)
+    parser.feed(text)
+    parser.close()
+    return parser.results
+
+
+def dumps(results):
+    """ json.dumps, timed """
+    with METRICS.timer('json_dumps'):
+        return json.dumps(results)
+
+
+def parse_sentiment_results(text):
+    """ Fast path of parse_parser_results() for when only the sentiment is
+    wanted: returns the sentiment label of each sentence, without building
+    the words, parse trees, dependencies or coreference sets.
+    """
+    return SENTIMENT_PATTERN.findall(text)
+
+
+def spawn_shell(command):
+    """ Starts a CoreNLP shell and waits until it prompts for input """
+    if VERBOSE:
+        print "Other verbose entered: "
+        print command
+    corenlp = pexpect.spawn(command, timeout=60, maxread=8192, searchwindowsize=80)
+
+    # show progress bar while loading the models
+    if VERBOSE:
+        print "Verbose entered: "
+        widgets = ['Loading Models: ', Fraction()]
+        pbar = ProgressBar(widgets=widgets, maxval=5, force_update=True).start()
+        # Model timeouts:
+        # pos tagger model (~5sec)
+        # NER-all classifier (~33sec)
+        # NER-muc classifier (~60sec)
+        # CoNLL classifier (~50sec)
+        # PCFG (~3sec)
+        timeouts = [20, 200, 600, 600, 20]
+        for i in xrange(5):
+            corenlp.expect("done.", timeout=timeouts[i])  # Load model
+            pbar.update(i + 1)
+        corenlp.expect("Entering interactive shell.")
+        pbar.finish()
+
+    # interactive shell
+    corenlp.expect(PROMPT)
+    # answers are read up to their prompt, or resynced with a marker,
+    # there is no need to pause before sending, and lines go out back to
+    # back
+    corenlp.delaybeforesend = None
+    # batches keep several lines in flight, their echo would land in
+    # the middle of the output
+    corenlp.setecho(False)
+    return corenlp
+
+
+class Standby(object):
+
+    """
+    A spare CoreNLP shell, loaded in the background ahead of need.
+
+    take() hands over the spare, already past model loading, and starts
+    loading the next one, so a crashed shell is replaced in the time of a
+    swap rather than of a JVM start. Share one between the workers of a
+    pool to pay the memory of a single spare.
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.lock = threading.Lock()
+        self.spare = None
+        self.loading = False
+        self.closed = False
+        self.refill()
+
+    def refill(self):
+        """ Starts loading a spare, unless there is one or it is on its way """
+        with self.lock:
+            if self.spare is not None or self.loading or self.closed:
+                return
+            self.loading = True
+        t = threading.Thread(target=self._load)
+        t.daemon = True
+        t.start()
+
+    def _load(self):
+        try:
+            spare = spawn_shell(self.command)
+        except Exception as e:
+            print >>sys.stderr, {'error': "could not load a spare CoreNLP shell: %s" % e}
+            with self.lock:
+                self.loading = False
+            threading.Timer(5.0, self.refill).start()
+            return
+        with self.lock:
+            self.loading = False
+            if not self.closed:
+                self.spare, spare = spare, None
+        if spare is not None:
+            spare.close()
+
+    def take(self):
+        """ The spare shell if it is loaded and alive, None otherwise """
+        with self.lock:
+            spare, self.spare = self.spare, None
+        if spare is not None and not spare.isalive():
+            spare = None
+        self.refill()
+        return spare
+
+    def check(self):
+        """ Replaces the spare if it died waiting """
+        with self.lock:
+            spare = self.spare
+            if spare is not None and not spare.isalive():
+                self.spare = None
+        self.refill()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            spare, self.spare = self.spare, None
+        if spare is not None:
+            spare.close()
 
-    return results
 
 class StanfordCoreNLP:
 
     """
     Command-line interaction with Stanford's CoreNLP java utilities.
     Can be run as a JSON-RPC server or imported as a module.
+
+    Imported as a module, lazy_words=True gives LazyToken words, which
+    are only split into attributes when read.
     """
 
+    lazy_words = False
+
     def _spawn_corenlp(self):
-        if VERBOSE:
-            print "Other verbose entered: "
-            print self.start_corenlp
-        self.corenlp = pexpect.spawn(self.start_corenlp, timeout=60, maxread=8192, searchwindowsize=80)
+        self.corenlp = spawn_shell(self.start_corenlp)
+        self._leftover = ''
+        self._synced = True
 
-        # show progress bar while loading the models
-        if VERBOSE:
-            print "Verbose entered: "
-            widgets = ['Loading Models: ', Fraction()]
-            pbar = ProgressBar(widgets=widgets, maxval=5, force_update=True).start()
-            # Model timeouts:
-            # pos tagger model (~5sec)
-            # NER-all classifier (~33sec)
-            # NER-muc classifier (~60sec)
-            # CoNLL classifier (~50sec)
-            # PCFG (~3sec)
-            timeouts = [20, 200, 600, 600, 20]
-            for i in xrange(5):
-                self.corenlp.expect("done.", timeout=timeouts[i])  # Load model
-                pbar.update(i + 1)
-            self.corenlp.expect("Entering interactive shell.")
-            pbar.finish()
-
-        # interactive shell
-        self.corenlp.expect("\nNLP> ")
-
-    def __init__(self, corenlp_path=DIRECTORY, memory="3g", properties='default.properties', serving=False):
+    def __init__(self, corenlp_path=DIRECTORY, memory="3g", properties='default.properties', serving=False,
+                 lazy_words=False, command=None, standby=None):
         """
         Checks the location of the jar files.
         Spawns the server as a process.
+        command replaces the java command line, to run a stand-in of the
+        shell such as benchmarks/fake_corenlp.py.
+        With a Standby, crashed shells are replaced by its spare.
         """
 
         # spawn the server
         self.serving = serving
+        self.lazy_words = lazy_words
+        self.standby = standby
+        self._frames = itertools.count()
+        self._frame_tag = os.urandom(4).encode('hex')
+        # seconds spent waiting on the shell in the current exchange
+        self._waited = 0.0
         xml_dir_server = tempfile.mkdtemp()
-        self.start_corenlp = init_corenlp_command(corenlp_path, memory, properties)
+        if command is None:
+            command = init_corenlp_command(corenlp_path, memory, properties)
+        self.start_corenlp = command
         self._spawn_corenlp()
 
     def close(self, force=True):
         self.corenlp.terminate(force)
 
+    def respawn(self):
+        """
+        Replaces the shell process with a fresh one, the spare of the
+        standby if one is ready
+        """
+        METRICS.inc('respawns')
+        self.corenlp.close()
+        spare = self.standby.take() if self.standby is not None else None
+        if spare is None:
+            self._spawn_corenlp()
+        else:
+            METRICS.inc('standby_swaps')
+            self.corenlp = spare
+            self._leftover = ''
+            self._synced = True
+
+    def probe(self, timeout=PROBE_TIMEOUT):
+        """ Whether the shell answers a one word text within timeout seconds """
+        if not self.isalive():
+            return False
+        try:
+            self._send(PROBE_TEXT, timeout)
+            for sentence in self._receive(ResultsParser(True), PROBE_TEXT, timeout):
+                pass
+        except (TimeoutError, ProcessError, OutOfMemoryError, ParserError):
+            return False
+        return True
+
     def isalive(self):
         return self.corenlp.isalive()
 
@@ -267,71 +567,269 @@ class StanfordCoreNLP:
         if self.isalive():
             self.close()
 
-    def _parse(self, text):
+    def _parse(self, text, sentiment_only=False):
         """
         This is the core interaction with the parser.
 
         It returns a Python data-structure, while the parse()
-        function returns a JSON object
+        function returns a JSON object. With sentiment_only, only the
+        list of sentence sentiment labels.
+        """
+        self._waited = 0.0
+        try:
+            parser = ResultsParser(sentiment_only, self.lazy_words)
+            for sentence in self._stream(text, parser):
+                pass
+            parser.close()
+        finally:
+            METRICS.observe('shell', self._waited)
+        return parser.results
+
+    def _stream(self, text, parser):
+        """
+        Sends text to the shell, returns the generator of its sentences
         """
-
         # CoreNLP interactive shell cannot recognize newline
         if '\n' in text or '\r' in text:
             to_send = re.sub("[\r\n]", " ", text).strip()
         else:
             to_send = text
 
-        # clean up anything leftover
-        def clean_up():
-            while True:
-                try:
-                    self.corenlp.read_nonblocking(8192, 0.1)
-                except pexpect.TIMEOUT:
-                    break
-        clean_up()
-
-        self.corenlp.sendline(to_send)
-
         # How much time should we give the parser to parse it?
         # the idea here is that you increase the timeout as a
         # function of the text's length.
         # max_expected_time = max(5.0, 3 + len(to_send) / 5.0)
         max_expected_time = max(300.0, len(to_send) / 3.0)
 
-        # repeated_input = self.corenlp.except("\n")  # confirm it
-        t = self.corenlp.expect(["\nNLP> ", pexpect.TIMEOUT, pexpect.EOF,
-                                 "\nWARNING: Parsing of sentence failed, possibly because of out of memory."],
-                                timeout=max_expected_time)
-        incoming = self.corenlp.before
-        if t == 1:
-            # TIMEOUT, clean up anything left in buffer
-            clean_up()
+        self._send(to_send, max_expected_time)
+        return self._receive(parser, to_send, max_expected_time)
+
+    def _marker(self):
+        """
+        A word no text sent before carries, for the shell to echo back.
+        Tag and number are closed by an x, so no marker is the start of
+        another one.
+        """
+        return 'frame%sx%dx' % (self._frame_tag, next(self._frames))
+
+    def _send(self, to_send, max_expected_time):
+        """
+        Sends to_send. After an exchange given up on (a timeout, an out of
+        memory warning, an answer not read to the end), sends a fresh
+        marker ahead of it and reads up to the answer to the marker:
+        whatever the shell still had to say comes before it and is
+        dropped, so the next answer read is the one to to_send, without
+        waiting for the shell to go quiet first.
+
+        The marker is a sentence the whole pipeline runs on, so it is only
+        sent then: an exchange read up to its prompt leaves the shell in
+        step, and the next one goes out on its own.
+        """
+        if self._synced:
+            if to_send is not None:
+                self.corenlp.sendline(to_send)
+            return
+        marker = self._marker()
+        self.corenlp.sendline(marker)
+        if to_send is not None:
+            self.corenlp.sendline(to_send)
+        self._resync(marker, max_expected_time)
+
+    def _resync(self, marker, max_expected_time):
+        """ Reads up to the prompt after the answer to marker """
+        deadline = time.time() + max_expected_time
+        pending = self._leftover
+        self._leftover = ''
+        while True:
+            found = pending.find(marker)
+            if found != -1:
+                prompt = pending.find(PROMPT, found)
+                if prompt != -1:
+                    self._leftover = pending[prompt + len(PROMPT):]
+                    return
+                pending = pending[found:]
+            else:
+                pending = pending[-len(marker):]
+            pending += self._read(deadline, marker, pending, max_expected_time)
+
+    def _read(self, deadline, to_send, pending, max_expected_time):
+        """
+        The next chunk of output, read before the deadline. The time spent
+        waiting on the shell adds up in _waited, reported as the shell
+        stage apart from the time spent parsing what it printed.
+        """
+        start = time.time()
+        try:
+            chunk = self.corenlp.read_nonblocking(8192, max(0, deadline - start))
+        except pexpect.TIMEOUT:
             print >>sys.stderr, {'error': "timed out after %f seconds" % max_expected_time,
                                  'input': to_send,
-                                 'output': incoming}
+                                 'output': pending}
+            METRICS.inc('timeouts')
             raise TimeoutError("Timed out after %d seconds" % max_expected_time)
-        elif t == 2:
+        except pexpect.EOF:
             # EOF, probably crash CoreNLP process
             print >>sys.stderr, {'error': "CoreNLP terminates abnormally while parsing",
                                  'input': to_send,
-                                 'output': incoming}
+                                 'output': pending}
+            METRICS.inc('process_errors')
             raise ProcessError("CoreNLP process terminates abnormally while parsing")
-        elif t == 3:
-            # out of memory
-            print >>sys.stderr, {'error': "WARNING: Parsing of sentence failed, possibly because of out of memory.",
-                                 'input': to_send,
-                                 'output': incoming}
-            raise OutOfMemoryError
-
+        finally:
+            self._waited += time.time() - start
         if VERBOSE:
-            print "%s\n%s" % ('=' * 40, incoming)
+            print chunk,
+        return chunk
+
+    def _receive(self, parser, to_send, max_expected_time):
+        """
+        Reads the answer to to_send up to the next prompt, feeding it to
+        parser chunk by chunk as it comes out of the pty. This is a
+        generator of the sentences finished along the way, it raises
+        TimeoutError, ProcessError or OutOfMemoryError if the shell does
+        not answer properly.
+
+        Only the last few bytes are held back, in case a prompt or a
+        warning is split across two reads. What follows the prompt is
+        kept for the next answer. A ParserError is only raised once the
+        whole answer is read, so the next one starts in the right place.
+        """
+        deadline = time.time() + max_expected_time
+        keep = len(OOM_WARNING)
+        pending = self._leftover
+        self._leftover = ''
+        # in step again once the answer is read up to its prompt
+        self._synced = False
+        errors = []
+
+        def feed(data):
+            if errors:
+                return []
+            try:
+                with METRICS.timer('parse_results'):
+                    return parser.feed(data)
+            except ParserError as e:
+                errors.append(e)
+                return []
+
+        while True:
+            prompt = pending.find(PROMPT)
+            oom = pending.find(OOM_WARNING)
+            if oom != -1 and (prompt == -1 or oom < prompt):
+                self._leftover = pending[oom + len(OOM_WARNING):]
+                print >>sys.stderr, {'error': "WARNING: Parsing of sentence failed, possibly because of out of memory.",
+                                     'input': to_send,
+                                     'output': pending[:oom]}
+                METRICS.inc('ooms')
+                raise OutOfMemoryError("Parsing of sentence failed, possibly because of out of memory")
+            if prompt != -1:
+                self._leftover = pending[prompt + len(PROMPT):]
+                self._synced = True
+                for sentence in feed(pending[:prompt]):
+                    yield sentence
+                if errors:
+                    raise errors[0]
+                return
+            if len(pending) > keep:
+                for sentence in feed(pending[:-keep]):
+                    yield sentence
+                pending = pending[-keep:]
+
+            pending += self._read(deadline, to_send, pending, max_expected_time)
+
+    def _parse_batch(self, texts, sentiment_only=False):
+        """
+        Sends a whole batch of texts through the interactive shell.
+
+        The shell answers every input line with its own output block and a
+        fresh prompt, so the n-th block read back belongs to the n-th line
+        sent. Lines are written ahead of the answers, as many as fit in
+        BATCH_WINDOW, so the JVM never waits on us between two texts.
+
+        Returns one entry per text: the parse_parser_results() dictionary,
+        or {'sentences': [], 'error': ...} if that text failed. With
+        sentiment_only, the list of sentiment labels, empty if it failed.
+        """
+        results = [None] * len(texts)
+        pending = collections.deque()
+        for i, text in enumerate(texts):
+            to_send = re.sub("[\r\n]", " ", text).strip()
+            if isinstance(to_send, unicode):
+                to_send = to_send.encode('utf-8')
+            if to_send:
+                pending.append((i, to_send))
+            elif sentiment_only:
+                results[i] = []
+            else:
+                results[i] = {'sentences': []}
+
+        self._waited = 0.0
         try:
-            print incoming
-            results = parse_parser_results(incoming)
-        except Exception as e:
-            if VERBOSE:
-                print traceback.format_exc()
-            raise e
+            # drop anything leftover, once for the whole batch
+            self._send(None, 300.0)
+            return self._exchange_batch(pending, results, sentiment_only)
+        finally:
+            METRICS.observe('shell_batch', self._waited)
+
+    def _exchange_batch(self, pending, results, sentiment_only):
+        """
+        Feeds the pending (index, line) pairs to the shell and fills
+        results with the answers, see _parse_batch()
+        """
+        if sentiment_only:
+            failure = lambda error: []
+        else:
+            failure = lambda error: {'sentences': [], 'error': error}
+
+        in_flight = collections.deque()
+        in_flight_bytes = 0
+        failed = set()
+        try:
+            while pending or in_flight:
+                while pending and (not in_flight or
+                                   in_flight_bytes + len(pending[0][1]) + 1 <= BATCH_WINDOW):
+                    i, to_send = pending.popleft()
+                    self.corenlp.sendline(to_send)
+                    in_flight.append((i, to_send))
+                    in_flight_bytes += len(to_send) + 1
+
+                i, to_send = in_flight[0]
+                max_expected_time = max(300.0, len(to_send) / 3.0)
+                parser = ResultsParser(sentiment_only, self.lazy_words)
+                try:
+                    for sentence in self._receive(parser, to_send, max_expected_time):
+                        pass
+                except OutOfMemoryError as e:
+                    # the shell gives up on this text and prompts again
+                    failed.add(i)
+                    results[i] = failure(e.value)
+                    continue
+                except (TimeoutError, ProcessError) as e:
+                    results[i] = failure(e.value)
+                    # the shell is gone or wedged, anything still in flight
+                    # goes again to a fresh one
+                    in_flight.popleft()
+                    pending.extendleft(reversed(in_flight))
+                    in_flight.clear()
+                    in_flight_bytes = 0
+                    self.respawn()
+                    continue
+                except ParserError as e:
+                    if i not in failed:
+                        results[i] = failure(e.value)
+                    failed.add(i)
+
+                in_flight.popleft()
+                in_flight_bytes -= len(to_send) + 1
+                if i not in failed:
+                    try:
+                        parser.close()
+                        results[i] = parser.results
+                    except ParserError as e:
+                        results[i] = failure(e.value)
+        except:
+            # lines may still be in flight, resync before the next exchange
+            self._synced = False
+            raise
 
         return results
 
@@ -341,13 +839,15 @@ class StanfordCoreNLP:
         reads in the result, parses the results and returns a list
         with one dictionary entry for each parsed sentence.
         """
+        return self._raw_parse(text)
+
+    def _raw_parse(self, text, sentiment_only=False):
         try:
-            r = self._parse(text)
+            r = self._parse(text, sentiment_only)
             return r
         except Exception as e:
             print e  # Should probably log somewhere instead of printing
-            self.corenlp.close()
-            self._spawn_corenlp()
+            self.respawn()
             if self.serving:  # We don't want to raise the exception when acting as a server
                 return []
             raise e
@@ -358,14 +858,473 @@ class StanfordCoreNLP:
         reads in the result, parses the results and returns a list
         with one dictionary entry for each parsed sentence, in JSON format.
         """
-        return json.dumps(self.raw_parse(text))
+        return dumps(self.raw_parse(text))
+
+    def iter_parse(self, text):
+        """
+        Same as raw_parse(), but yields each sentence dictionary as soon as
+        the shell is done printing its block, instead of the whole list
+        at the end. Errors are raised, the caller decides about restarting.
+        """
+        parser = ResultsParser(lazy=self.lazy_words)
+        for sentence in self._stream(text, parser):
+            yield sentence
+        for sentence in parser.close():
+            yield sentence
+
+    def raw_parse_batch(self, texts):
+        """
+        This function takes a list of text strings and sends them to the
+        Stanford parser in one interaction. It returns a list with one
+        entry per text, each one being what raw_parse() would return for
+        it. A text that fails gets an 'error' key instead of stopping
+        the batch.
+        """
+        return self._parse_batch(texts)
+
+    def parse_batch(self, texts):
+        """
+        Same as raw_parse_batch(), in JSON format.
+        """
+        return dumps(self.raw_parse_batch(texts))
+
+    def sentiment(self, text):
+        """
+        Sentiment-only fast path: returns the sentiment label of each
+        sentence of the text and nothing else. Pairs with the
+        sentiment.properties profile, which skips the annotators the
+        labels do not need.
+        """
+        return self._raw_parse(text, sentiment_only=True)
+
+    def sentiment_batch(self, texts):
+        """
+        Same as sentiment(), for a list of texts sent in one interaction
+        """
+        return self._parse_batch(texts, sentiment_only=True)
+
+
+class IdleQueue(Queue.Queue):
+
+    """
+    Queue of the idle workers of a pool, handing a worker put straight to
+    the longest waiting get.
+
+    Python 2 waits out the timeout of a Queue.get in sleeps of up to 50ms,
+    so a worker freed up meanwhile sat unused. Here every get waits on an
+    event of its own, without a timeout, and a single thread wakes those
+    whose timeout is up. It sleeps until the earliest deadline at the
+    time, which is never late as every get of a pool takes the same
+    timeout.
+    """
+
+    def __init__(self):
+        Queue.Queue.__init__(self)
+        # [event, deadline, worker] of the gets waiting, oldest first
+        self.waiters = collections.deque()
+        self.timed = threading.Condition(self.mutex)
+        self.reaper = None
+
+    def put(self, item, block=True, timeout=None):
+        with self.mutex:
+            if self.waiters:
+                waiter = self.waiters.popleft()
+                waiter[2] = item
+                waiter[0].set()
+            else:
+                self.queue.append(item)
+
+    def get(self, block=True, timeout=None):
+        with self.mutex:
+            if self.queue:
+                return self.queue.popleft()
+            if not block or (timeout is not None and timeout <= 0):
+                raise Queue.Empty
+            waiter = [threading.Event(), None, None]
+            if timeout is not None:
+                waiter[1] = time.time() + timeout
+                if self.reaper is None:
+                    self.reaper = threading.Thread(target=self._reap)
+                    self.reaper.daemon = True
+                    self.reaper.start()
+                self.timed.notify()
+            self.waiters.append(waiter)
+        waiter[0].wait()
+        if waiter[2] is None:
+            raise Queue.Empty
+        return waiter[2]
+
+    def _reap(self):
+        """ Wakes the gets whose timeout is up, empty handed """
+        while True:
+            with self.mutex:
+                now = time.time()
+                deadlines = []
+                for waiter in list(self.waiters):
+                    if waiter[1] is None:
+                        continue
+                    if waiter[1] <= now:
+                        self.waiters.remove(waiter)
+                        waiter[0].set()
+                    else:
+                        deadlines.append(waiter[1])
+                if not deadlines:
+                    self.timed.wait()
+                    continue
+            time.sleep(min(deadlines) - now)
+
+
+class StanfordCoreNLPPool:
+
+    """
+    A pool of StanfordCoreNLP children behind the same parse interface.
+
+    Idle children wait in a queue, every request takes one out for the
+    time of its parse, so up to `workers` texts are parsed at once.
+    A child found dead is respawned in the background while the request
+    moves on to the next idle one.
+
+    At most `max_queue` requests wait for a worker, for at most
+    `queue_timeout` seconds. Past that they fail fast with ServerBusyError
+    instead of piling up.
+
+    With a ResultCache, texts parsed before are answered from it without
+    taking a worker.
+
+    With standby, one more shell is kept loaded and swapped in for any
+    worker that fails. With probe_interval, idle workers are sent a probe
+    every so many seconds and replaced if they do not answer within
+    probe_timeout, before a request finds them wedged.
+    """
+
+    def __init__(self, workers=2, corenlp_path=DIRECTORY, memory="3g", properties='default.properties', serving=False,
+                 max_queue=16, queue_timeout=30.0, cache=None, command=None, standby=False,
+                 probe_interval=None, probe_timeout=PROBE_TIMEOUT):
+        self.size = workers
+        self.cache = cache
+        self.idle = IdleQueue()
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.queue_timeout = queue_timeout
+        self.standby = None
+        if standby:
+            self.standby = Standby(command or init_corenlp_command(corenlp_path, memory, properties))
+
+        # loading the models takes a while, load them side by side
+        spawned = []
+        def spawn():
+            spawned.append(StanfordCoreNLP(corenlp_path, memory, properties, serving, command=command,
+                                           standby=self.standby))
+        threads = [threading.Thread(target=spawn) for i in xrange(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if len(spawned) < workers:
+            raise ProcessError("Only %d of %d CoreNLP workers started" % (len(spawned), workers))
+        for worker in spawned:
+            self.idle.put(worker)
+
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.closed = threading.Event()
+        if probe_interval:
+            t = threading.Thread(target=self._probe_loop)
+            t.daemon = True
+            t.start()
+
+    def _probe_loop(self):
+        while not self.closed.wait(self.probe_interval):
+            self.probe()
+
+    def probe(self):
+        """
+        Probes the workers idle right now, one at a time, and replaces
+        those that do not answer. A probe takes a slot of the queue like
+        a request, so requests are never turned away for probes, and
+        none is made while every slot is taken or no worker is idle.
+        """
+        for i in xrange(self.idle.qsize()):
+            if not self.slots.acquire(False):
+                break
+            try:
+                worker = self.idle.get_nowait()
+            except Queue.Empty:
+                self.slots.release()
+                break
+            if worker.probe(self.probe_timeout):
+                self.release(worker)
+            else:
+                self.slots.release()
+                METRICS.inc('probe_failures')
+                print >>sys.stderr, {'error': "CoreNLP worker failed its health probe, replacing it"}
+                self._respawn(worker)
+        if self.standby is not None:
+            self.standby.check()
+
+    def _respawn(self, worker):
+        def respawn():
+            try:
+                worker.respawn()
+            except Exception as e:
+                print >>sys.stderr, {'error': "could not respawn CoreNLP worker: %s" % e}
+                threading.Timer(5.0, self._respawn, (worker,)).start()
+                return
+            self.idle.put(worker)
+        t = threading.Thread(target=respawn)
+        t.daemon = True
+        t.start()
+
+    def acquire(self):
+        """ Takes an idle, live worker out of the pool, waiting if needed """
+        if not self.slots.acquire(False):
+            METRICS.inc('busy')
+            raise ServerBusyError("All workers are busy and the queue is full, retry later")
+        try:
+            with METRICS.timer('queue_wait'):
+                if self.queue_timeout is not None:
+                    deadline = time.time() + self.queue_timeout
+                while True:
+                    try:
+                        if self.queue_timeout is None:
+                            worker = self.idle.get()
+                        else:
+                            worker = self.idle.get(timeout=max(0, deadline - time.time()))
+                    except Queue.Empty:
+                        METRICS.inc('busy')
+                        raise ServerBusyError("No worker freed up in %d seconds, retry later" % self.queue_timeout)
+                    if worker.isalive():
+                        return worker
+                    self._respawn(worker)
+        except:
+            self.slots.release()
+            raise
+
+    def release(self, worker):
+        self.idle.put(worker)
+        self.slots.release()
+
+    def _call(self, method, text, kind=''):
+        """ Runs a worker's method on text, through the cache """
+        if self.cache is not None:
+            cached = self.cache.get(text, kind)
+            if cached is not None:
+                return cached
+        worker = self.acquire()
+        try:
+            result = getattr(worker, method)(text)
+        finally:
+            self.release(worker)
+        # failures come back empty when serving, don't keep those
+        if self.cache is not None and result:
+            self.cache.put(text, result, kind)
+        return result
+
+    def raw_parse(self, text):
+        return self._call('raw_parse', text)
+
+    def sentiment(self, text):
+        return self._call('sentiment', text, 'sentiment')
+
+    def parse(self, text):
+        return dumps(self.raw_parse(text))
+
+    def raw_parse_batch(self, texts):
+        """
+        Splits the batch over the workers and parses the parts side by side,
+        results come back in the order of texts
+        """
+        return self._call_batch('raw_parse_batch', texts)
+
+    def sentiment_batch(self, texts):
+        return self._call_batch('sentiment_batch', texts, 'sentiment')
+
+    def _call_batch(self, method, texts, kind=''):
+        """ Runs a worker's batch method on texts, through the cache """
+        if self.cache is None:
+            return self._split_batch(method, texts)
+
+        results = [self.cache.get(text, kind) for text in texts]
+        missing = collections.OrderedDict()
+        for i, result in enumerate(results):
+            if result is None:
+                missing.setdefault(texts[i], []).append(i)
+        parsed = self._split_batch(method, missing.keys())
+        for (text, indexes), result in zip(missing.items(), parsed):
+            for i in indexes:
+                results[i] = result
+            if result and 'error' not in result:
+                self.cache.put(text, result, kind)
+        return results
+
+    def _split_batch(self, method, texts):
+        step = max(1, -(-len(texts) // self.size))
+        chunks = [texts[i:i + step] for i in xrange(0, len(texts), step)]
+        results = [None] * len(chunks)
+        # what the threads raised, busy or not, raised again here with
+        # its traceback
+        errors = []
+
+        def run(n):
+            try:
+                worker = self.acquire()
+            except Exception:
+                errors.append(sys.exc_info())
+                return
+            try:
+                results[n] = getattr(worker, method)(chunks[n])
+            except Exception:
+                errors.append(sys.exc_info())
+            finally:
+                self.release(worker)
+        threads = [threading.Thread(target=run, args=(n,)) for n in xrange(len(chunks))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            error_type, error, trace = errors[0]
+            raise error_type, error, trace
+        return [r for chunk in results for r in chunk]
+
+    def parse_batch(self, texts):
+        return dumps(self.raw_parse_batch(texts))
+
+    def cache_stats(self):
+        """ Hit, miss and eviction counters of the result cache """
+        if self.cache is None:
+            return {}
+        return self.cache.stats()
+
+    def close(self):
+        self.closed.set()
+        for i in xrange(self.size):
+            self.idle.get().close()
+        if self.standby is not None:
+            self.standby.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+class KeepAliveJSONRPCRequestHandler(SimpleJSONRPCRequestHandler):
+
+    """
+    Answers in HTTP/1.1 and leaves the connection open, so a client can
+    send all its requests over one connection instead of one per request.
+
+    GET /metrics answers the metrics in the Prometheus text format.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.report_404()
+            return
+        response = METRICS.render()
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; version=0.0.4")
+        self.send_header("Content-length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.is_rpc_path_valid():
+            self.report_404()
+            return
+        try:
+            data = self.rfile.read(int(self.headers["content-length"]))
+            with METRICS.timer('rpc_request'):
+                response = self.server._marshaled_dispatch(data)
+            self.send_response(200)
+        except Exception:
+            self.send_response(500)
+            err_lines = traceback.format_exc().splitlines()
+            trace_string = '%s | %s' % (err_lines[-3], err_lines[-1])
+            fault = jsonrpclib.Fault(-32603, 'Server error: %s' % trace_string)
+            response = fault.response()
+        if response is None:
+            response = ''
+        self.send_header("Content-type", "application/json-rpc")
+        self.send_header("Content-length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+        self.wfile.flush()
+
+
+class ThreadedJSONRPCServer(SocketServer.ThreadingMixIn, SimpleJSONRPCServer):
+
+    """
+    JSON-RPC server handling every connection in its own thread. The calls
+    of a batch (multicall) request are dispatched side by side as well, by
+    batch_workers threads, so they spread over the workers of a
+    StanfordCoreNLPPool without taking more of its queue than there are
+    workers to take them: a batch larger than the queue is not answered
+    busy in part.
+    """
+
+    daemon_threads = True
+    # let connections queue in the kernel, they are turned away with a
+    # SERVER_BUSY error by the pool rather than refused
+    request_queue_size = 128
+
+    def __init__(self, addr, requestHandler=KeepAliveJSONRPCRequestHandler, batch_workers=1,
+                 **kwargs):
+        SimpleJSONRPCServer.__init__(self, addr, requestHandler, **kwargs)
+        self.batch_workers = batch_workers
+
+    def register_function(self, function, name=None):
+        """ Registers function, answering ServerBusyError with a SERVER_BUSY fault """
+        def call(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            except ServerBusyError as e:
+                return jsonrpclib.Fault(SERVER_BUSY, e.value)
+        SimpleJSONRPCServer.register_function(self, call, name or function.__name__)
+
+    def _marshaled_dispatch(self, data, dispatch_method=None):
+        if not data.lstrip().startswith('['):
+            return SimpleJSONRPCServer._marshaled_dispatch(self, data, dispatch_method)
+        try:
+            request = jsonrpclib.loads(data)
+        except Exception:
+            request = None
+        if not isinstance(request, list) or not request:
+            return SimpleJSONRPCServer._marshaled_dispatch(self, data, dispatch_method)
+
+        responses = [None] * len(request)
+        entries = enumerate(request)
+        lock = threading.Lock()
+
+        def dispatch():
+            while True:
+                with lock:
+                    i, entry = next(entries, (None, None))
+                if i is None:
+                    return
+                valid = validate_request(entry)
+                if type(valid) is jsonrpclib.Fault:
+                    responses[i] = valid.response()
+                else:
+                    responses[i] = self._marshaled_single_dispatch(entry)
+        threads = [threading.Thread(target=dispatch)
+                   for n in xrange(min(self.batch_workers, len(request)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        responses = [r for r in responses if r is not None]
+        if not responses:
+            return ''
+        return '[%s]' % ','.join(responses)
 
 
 def main():
     """
     The code below starts an JSONRPC server
     """
-    from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+    # only the server parses options, clients importing the package skip it
+    import optparse
     parser = optparse.OptionParser(usage="%prog [OPTIONS]")
     parser.add_option('-p', '--port', default='8080',
                       help='Port to serve on (default 8080)')
@@ -376,16 +1335,58 @@ def main():
     parser.add_option('-S', '--corenlp', default=DIRECTORY,
                       help='Stanford CoreNLP tool directory (default %s)' % DIRECTORY)
     parser.add_option('-P', '--properties', default='default.properties',
-                      help='Stanford CoreNLP properties fieles (default: default.properties)')
+                      help='Stanford CoreNLP properties fieles (default: default.properties, '
+                           'sentiment.properties to only serve sentiment labels)')
+    parser.add_option('-w', '--workers', default='1',
+                      help='Number of CoreNLP processes parsing side by side (default 1)')
+    parser.add_option('-Q', '--max-queue', default='16',
+                      help='Requests allowed to wait for a busy worker before the server answers "busy", '
+                           'the calls of a batch request taking one per worker at most (default 16)')
+    parser.add_option('-T', '--queue-timeout', default='30',
+                      help='Seconds a request waits for a worker before the server answers "busy" (default 30)')
+    parser.add_option('-c', '--cache-size', default='10000',
+                      help='Parse results kept in memory, 0 to disable (default 10000)')
+    parser.add_option('-C', '--cache-db', default=None,
+                      help='SQLite file keeping parse results across restarts (default: none)')
+    parser.add_option('-s', '--standby', action='store_true', default=False,
+                      help='Keep one more CoreNLP process loaded, swapped in when a worker fails')
+    parser.add_option('-I', '--probe-interval', default='0',
+                      help='Seconds between health probes of the idle workers, 0 for none (default 0)')
+    parser.add_option('-m', '--metrics', action='store_true', default=False,
+                      help='Time every stage of the analysis, served at /metrics and by the '
+                           'metrics and metrics_summary methods (default: off)')
+    parser.add_option('--command', default=None,
+                      help='Command run instead of CoreNLP, such as the stand-in '
+                           'benchmarks/fake_corenlp.py (default: none)')
     options, args = parser.parse_args()
     VERBOSE = options.verbose
+    METRICS.enabled = options.metrics
     
     try:
-        server = SimpleJSONRPCServer((options.host, int(options.port)))
-
-        nlp = StanfordCoreNLP(options.corenlp, properties=options.properties, serving=True)
+        server = ThreadedJSONRPCServer((options.host, int(options.port)),
+                                       batch_workers=int(options.workers))
+
+        cache = None
+        if int(options.cache_size) or options.cache_db:
+            cache = ResultCache(int(options.cache_size), options.cache_db,
+                                properties_digest(locate_properties(options.properties)))
+
+        nlp = StanfordCoreNLPPool(int(options.workers), options.corenlp,
+                                  properties=options.properties, serving=True,
+                                  max_queue=int(options.max_queue),
+                                  queue_timeout=float(options.queue_timeout),
+                                  cache=cache, command=options.command,
+                                  standby=options.standby,
+                                  probe_interval=float(options.probe_interval))
         server.register_function(nlp.parse)
         server.register_function(nlp.raw_parse)
+        server.register_function(nlp.parse_batch)
+        server.register_function(nlp.raw_parse_batch)
+        server.register_function(nlp.sentiment)
+        server.register_function(nlp.sentiment_batch)
+        server.register_function(nlp.cache_stats)
+        server.register_function(METRICS.render, 'metrics')
+        server.register_function(METRICS.summary, 'metrics_summary')
 
         print 'Serving on http://%s:%s' % (options.host, options.port)
         # server.serve()
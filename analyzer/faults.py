@@ -0,0 +1,6 @@
+"""
+JSON-RPC fault codes of the server, shared with its clients
+"""
+
+# a request turned away because every worker is busy
+SERVER_BUSY = -32001
@@ -0,0 +1,155 @@
+"""
+Latency histograms and event counters of the analysis stages
+"""
+import time
+import bisect
+import threading
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram(object):
+
+    """ Observations counted per bucket, along with their count and sum """
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, fraction):
+        """ Upper bound of the bucket holding the quantile """
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class _Timer(object):
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.time() - self.start)
+
+
+class _NullTimer(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+
+    """
+    Named latency histograms and counters, safe to update from any thread.
+
+    Disabled, timer() hands out a shared do-nothing context manager and
+    observe()/inc() return straight away, so the hooks can stay in the
+    hot paths.
+    """
+
+    def __init__(self, enabled=False, prefix='corenlp'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def timer(self, name):
+        """ Context manager observing the time spent in its block """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        """ Count, mean, p50/p95/p99 of every stage and the counters """
+        with self.lock:
+            stages = {}
+            for name, histogram in self.histograms.iteritems():
+                stages[name] = {'count': histogram.count, 'sum': histogram.sum,
+                                'mean': histogram.sum / histogram.count,
+                                'p50': histogram.quantile(0.5),
+                                'p95': histogram.quantile(0.95),
+                                'p99': histogram.quantile(0.99)}
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def render(self):
+        """ The metrics in the Prometheus text exposition format """
+        lines = []
+        with self.lock:
+            if self.histograms:
+                name = '%s_stage_seconds' % self.prefix
+                lines.append('# HELP %s Time spent in each stage of the analysis' % name)
+                lines.append('# TYPE %s histogram' % name)
+                for stage in sorted(self.histograms):
+                    histogram = self.histograms[stage]
+                    seen = 0
+                    for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                        seen += count
+                        lines.append('%s_bucket{stage="%s",le="%s"} %d' % (name, stage, bound, seen))
+                    lines.append('%s_sum{stage="%s"} %r' % (name, stage, histogram.sum))
+                    lines.append('%s_count{stage="%s"} %d' % (name, stage, histogram.count))
+            for counter in sorted(self.counters):
+                name = '%s_%s_total' % (self.prefix, counter)
+                lines.append('# TYPE %s counter' % name)
+                lines.append('%s %d' % (name, self.counters[counter]))
+        return '\n'.join(lines) + '\n'
+
+
+def format_summary(summary):
+    """ The summary as lines of text, latencies in milliseconds """
+    lines = []
+    for name in sorted(summary['stages']):
+        stage = summary['stages'][name]
+        lines.append('%-16s %8d calls  mean %9.3fms  p50 <= %gms  p95 <= %gms  p99 <= %gms' % (
+            name, stage['count'], stage['mean'] * 1000, stage['p50'] * 1000,
+            stage['p95'] * 1000, stage['p99'] * 1000))
+    for name in sorted(summary['counters']):
+        lines.append('%-16s %8d' % (name, summary['counters'][name]))
+    return lines
+
+
+# what the analyzer records into, enabled by corenlp.py --metrics
+METRICS = Metrics()
@@ -0,0 +1,68 @@
+'''
+Tweets read back from archives of captured tweets, one JSON document per
+line, plain or gzip compressed
+'''
+import io
+import os
+import gzip
+import json
+import mmap
+import itertools
+
+GZIP_MAGIC = '\x1f\x8b'
+
+
+def is_gzip(path):
+    with open(path, 'rb') as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def _mapped_lines(path):
+    ''' Lines of an uncompressed file, read through a memory map so only
+    the pages being looked at are resident
+    '''
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for line in iter(mapped.readline, ''):
+                yield line
+        finally:
+            mapped.close()
+
+
+def _gzip_lines(path):
+    with io.BufferedReader(gzip.open(path, 'rb')) as f:
+        for line in f:
+            yield line
+
+
+def lines(path):
+    ''' The raw lines of an archive, whatever its compression '''
+    if is_gzip(path):
+        return _gzip_lines(path)
+    return _mapped_lines(path)
+
+
+def read_tweets(path, offset=0, limit=None):
+    ''' Generator over the tweets of an archive, from its line offset and
+    for limit lines, so one archive can be split across jobs.
+
+    Offset and limit count lines rather than tweets: the lines skipped to
+    get to offset are not decoded, so resuming far into an archive costs
+    no more than reading up to there. Blank lines, lines that are not JSON
+    and records without text (delete notices and the like) are not tweets
+    and are left out.
+    '''
+    stop = None if limit is None else offset + limit
+    for line in itertools.islice(lines(path), offset, stop):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            tweet = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(tweet, dict) and tweet.get('text'):
+            yield tweet
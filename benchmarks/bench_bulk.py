@@ -0,0 +1,67 @@
+'''
+Lexicon scoring throughput, tweet by tweet against whole batches with
+NumPy, in tweets per second
+
+    python benchmarks/bench_bulk.py [--tweets 200000] [--batch 10000]
+'''
+import os
+import sys
+import timeit
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpus
+from script import get_normalizer, lexicon_pre_processing
+from lexicon import LexiconClassifier
+from bulk import BulkScorer
+
+
+def rate(func, count):
+    start = timeit.default_timer()
+    func()
+    return count / (timeit.default_timer() - start)
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark bulk lexicon scoring')
+    parser.add_argument('--tweets', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=10000)
+    args = parser.parse_args()
+
+    raw = corpus.tweets(args.tweets)
+    texts = [lexicon_pre_processing(text) for text in raw]
+    texts = [text for text in texts if text]
+    batches = [texts[i:i + args.batch] for i in xrange(0, len(texts), args.batch)]
+    normalizer = get_normalizer()
+    classifier = LexiconClassifier()
+    scorer = BulkScorer()
+
+    def one_by_one():
+        for text in texts:
+            classifier.classify(text)
+
+    def bulk():
+        for batch in batches:
+            scorer.values(scorer.score(batch)[0])
+
+    def normalize():
+        for text in raw:
+            lexicon_pre_processing(text)
+
+    def normalize_many():
+        for i in xrange(0, len(raw), args.batch):
+            normalizer.normalize_many(raw[i:i + args.batch], kept=True)
+
+    single = rate(one_by_one, len(texts))
+    vectorized = rate(bulk, len(texts))
+    print 'tweet by tweet:       %10.0f tweets/s' % single
+    print 'NumPy, batches of %-5d %9.0f tweets/s  (%.1fx)' % (args.batch, vectorized, vectorized / single)
+    print 'pre processing alone: %10.0f tweets/s' % rate(normalize, len(raw))
+    print '  batches of %-5d      %10.0f tweets/s' % (args.batch, rate(normalize_many, len(raw)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Near duplicate index at scale: lookups and inserts per second and memory
+once it holds millions of tweets, and how many parses it spares on tweets
+copied with other links, user tags and hashtags
+
+    python benchmarks/bench_neardup.py [--entries 1000000] [--distance 3]
+'''
+import os
+import sys
+import random
+import resource
+import timeit
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpus
+from script import data_pre_processing
+from neardup import NearDuplicates
+
+
+def copies(count, share=0.3, seed=5):
+    ''' count tweets, share of them copies of an earlier one with another
+    link, user tag or trailing hashtag
+    '''
+    rnd = random.Random(seed)
+    originals = corpus.tweets(count, seed)
+    out = []
+    for text in originals:
+        if out and rnd.random() < share:
+            text = rnd.choice(out).split(' #')[0]
+            text = rnd.choice(['@user%d ' % rnd.randint(0, 999) + text,
+                               text + ' http://t.co/%d' % rnd.randint(0, 9999),
+                               text + ' #tag%d' % rnd.randint(0, 999)])
+        out.append(text)
+    return out
+
+
+def maxrss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the near duplicate index')
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--distance', type=int, default=3)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--tweets', type=int, default=20000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    index = NearDuplicates(args.distance, args.entries)
+    before = maxrss_mb()
+    start = timeit.default_timer()
+    for n in xrange(args.entries):
+        index.add(rnd.getrandbits(64), 'Neutral')
+    added = timeit.default_timer() - start
+    print '%d entries added in %.1fs, %.1fus each, %.0fMB' % (
+        args.entries, added, 1e6 * added / args.entries, maxrss_mb() - before)
+
+    probes = [rnd.getrandbits(64) for _ in xrange(args.lookups)]
+    start = timeit.default_timer()
+    for fingerprint in probes:
+        index.find(fingerprint)
+    found = timeit.default_timer() - start
+    print '%d lookups at %d entries: %.1fus each' % (
+        args.lookups, len(index), 1e6 * found / args.lookups)
+
+    start = timeit.default_timer()
+    for fingerprint in probes:
+        index.add(fingerprint, 'Neutral')
+    replaced = timeit.default_timer() - start
+    print '%d inserts replacing the oldest: %.1fus each' % (
+        args.lookups, 1e6 * replaced / args.lookups)
+
+    texts = [data_pre_processing(text) for text in copies(args.tweets)]
+    texts = [text for text in texts if text]
+    index = NearDuplicates(args.distance)
+    start = timeit.default_timer()
+    for text in texts:
+        fingerprint = index.fingerprint(text)
+        if fingerprint is not None and index.find(fingerprint) is None:
+            index.add(fingerprint, 'Neutral')
+    elapsed = timeit.default_timer() - start
+    print '%.1fus per tweet fingerprinted and looked up' % (1e6 * elapsed / len(texts))
+    for line in index.report():
+        print line
+
+
+if __name__ == '__main__':
+    main()
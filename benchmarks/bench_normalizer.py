@@ -0,0 +1,96 @@
+'''
+Per-tweet cost of the nested-loop pre-processing against TweetNormalizer
+
+    python benchmarks/bench_normalizer.py [--tweets 2000]
+'''
+import os
+import sys
+import random
+import timeit
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from normalizer import TweetNormalizer, load_slangs, load_stopwords
+
+
+def legacy_pre_processing(tweet, slangs, stopwords_list):
+    ''' The original script.data_pre_processing, kept as the reference '''
+    if tweet == ' ':
+        return None
+    tokens = tweet.split(' ')
+    for i in range(len(tokens)):
+        for key in slangs.keys():
+            if key == tokens[i]:
+                tokens[i] = slangs[key]
+    for i in range(len(tokens)):
+        for key in config.EMOTICONS.keys():
+            if key == tokens[i]:
+                tokens[i] = config.EMOTICONS[key]
+    for token in range(len(tokens)):
+        if tokens[token].startswith('http') or tokens[token].startswith('www'):
+            tokens[token] = '||U||'
+        elif tokens[token].startswith('@'):
+            tokens[token] = '||T||'
+        elif tokens[token] in ['not', 'no', 'never', 'n\'t', 'cannot']:
+            tokens[token] = 'NOT'
+    stop = list(stopwords_list)
+    tokens = [i for i in tokens if i not in stop]
+    return "".join([' ' + token + ' ' for token in tokens])
+
+
+def make_tweets(count, slangs, seed=42):
+    ''' Tweets mixing plain words, slangs, emoticons, links and mentions '''
+    rnd = random.Random(seed)
+    words = ['the', 'movie', 'was', 'not', 'great', 'i', 'love', 'this',
+             'phone', 'never', 'again', 'battery', 'is', 'awful', 'today']
+    extras = sorted(slangs)[:500] + sorted(config.EMOTICONS) + \
+        ['http://t.co/abc', 'www.example.com', '@someone']
+    tweets = []
+    for _ in xrange(count):
+        tokens = [rnd.choice(words) for _ in xrange(rnd.randint(8, 18))]
+        for _ in xrange(rnd.randint(1, 4)):
+            tokens.insert(rnd.randint(0, len(tokens)), rnd.choice(extras))
+        tweets.append(' '.join(tokens))
+    return tweets
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark tweet pre-processing')
+    parser.add_argument('--tweets', type=int, default=2000)
+    args = parser.parse_args()
+
+    slangs = load_slangs()
+    stop = load_stopwords()
+    tweets = make_tweets(args.tweets, slangs)
+
+    start = timeit.default_timer()
+    normalizer = TweetNormalizer(slangs, config.EMOTICONS, stop)
+    build = timeit.default_timer() - start
+
+    # the nested loops only follow a chained slang when the next key comes
+    # later in dict order, the normalizer always follows it to the end
+    legacy_sample = tweets[:max(1, len(tweets) // 10)]
+    differ = sum(1 for tweet in legacy_sample
+                 if normalizer.normalize(tweet) !=
+                 legacy_pre_processing(tweet, slangs, stop))
+
+    start = timeit.default_timer()
+    for tweet in legacy_sample:
+        legacy_pre_processing(tweet, slangs, stop)
+    legacy = (timeit.default_timer() - start) / len(legacy_sample)
+
+    start = timeit.default_timer()
+    normalizer.normalize_many(tweets)
+    fast = (timeit.default_timer() - start) / len(tweets)
+
+    print 'normalizer build:  %8.2f ms' % (build * 1e3)
+    print 'legacy per tweet:  %8.2f us' % (legacy * 1e6)
+    print 'single pass:       %8.2f us' % (fast * 1e6)
+    print 'speedup:           %8.1fx' % (legacy / fast)
+    print 'chained slangs:    %8d of %d tweets' % (differ, len(legacy_sample))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+'''
+Phrase matching throughput with the real slang lexicon and with lexicons
+10 and 100 times larger. The automaton takes one transition per character
+whatever the size of the lexicon: the made up phrases can never occur in
+the tweets, so the hits stay those of the real lexicon and the time per
+character should stay flat.
+
+    python benchmarks/bench_phrases.py [--tweets 5000]
+'''
+import os
+import sys
+import random
+import string
+import timeit
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import config
+import corpus
+from normalizer import load_slangs
+from phrases import PhraseMatcher
+
+
+def grow(slangs, factor, absent, seed=42):
+    ''' slangs along with made up ones, factor times as many in all, of
+    the same lengths, each with one of the absent characters somewhere
+    '''
+    rnd = random.Random(seed)
+    alphabet = string.ascii_lowercase + string.digits
+    lengths = [len(slang) for slang in slangs]
+    grown = set(slangs)
+    while len(grown) < factor * len(slangs):
+        made_up = [rnd.choice(alphabet) for _ in xrange(rnd.choice(lengths))]
+        made_up[rnd.randrange(len(made_up))] = rnd.choice(absent)
+        grown.add(''.join(made_up))
+    return grown
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the phrase matcher')
+    parser.add_argument('--tweets', type=int, default=5000)
+    args = parser.parse_args()
+
+    slangs = list(load_slangs())
+    texts = [text.encode('utf-8') for text in corpus.tweets(args.tweets)]
+    characters = sum(len(text) for text in texts)
+    absent = sorted(set(string.ascii_lowercase + string.digits) - set(''.join(texts)))
+    if not absent:
+        parser.error('every letter and digit occurs in the tweets')
+
+    for factor in (1, 10, 100):
+        phrases = grow(slangs, factor, absent)
+        start = timeit.default_timer()
+        matcher = PhraseMatcher(phrases, config.EMOTICONS)
+        build = timeit.default_timer() - start
+        # the first run takes the transitions for the first time
+        for text in texts:
+            matcher.find(text)
+        start = timeit.default_timer()
+        found = sum(len(matcher.find(text)) for text in texts)
+        elapsed = timeit.default_timer() - start
+        # looking for each phrase in turn, on a sample
+        sample = texts[:20]
+        start = timeit.default_timer()
+        for text in sample:
+            [phrase for phrase in phrases if phrase in text]
+        naive = timeit.default_timer() - start
+        print '%4dx %7d phrases  build %6.0f ms  %6.3f us/char  %6.2f us/tweet  %5d hits' \
+            '  (one phrase at a time: %8.0f us/tweet)' % (
+                factor, len(phrases), build * 1e3, elapsed / characters * 1e6,
+                elapsed / len(texts) * 1e6, found, naive / len(sample) * 1e6)
+
+
+if __name__ == '__main__':
+    main()
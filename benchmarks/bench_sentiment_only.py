@@ -0,0 +1,48 @@
+'''
+What the sentiment-only profile saves per tweet on the Python side: time
+to parse the shell output and bytes sent back over JSON-RPC
+
+    python benchmarks/bench_sentiment_only.py [--tweets 2000]
+'''
+import os
+import sys
+import json
+import timeit
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpus
+from analyzer.corenlp import parse_parser_results, parse_sentiment_results
+
+
+def measure(parse, outputs):
+    start = timeit.default_timer()
+    results = [parse(output) for output in outputs]
+    elapsed = (timeit.default_timer() - start) / len(outputs)
+    size = sum(len(json.dumps(result)) for result in results) / float(len(outputs))
+    return elapsed, size
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the sentiment-only fast path')
+    parser.add_argument('--tweets', type=int, default=2000)
+    args = parser.parse_args()
+
+    texts = corpus.tweets(args.tweets)
+    full = [corpus.corenlp_output(text, i) for i, text in enumerate(texts)]
+    slim = [corpus.corenlp_output(text, i, full=False) for i, text in enumerate(texts)]
+
+    full_time, full_size = measure(parse_parser_results, full)
+    slim_time, slim_size = measure(parse_sentiment_results, slim)
+
+    print 'full profile:    %8.1f us  %8.0f bytes/tweet' % (full_time * 1e6, full_size)
+    print 'sentiment only:  %8.1f us  %8.0f bytes/tweet' % (slim_time * 1e6, slim_size)
+    print 'saved:           %8.1f us  %8.0f bytes/tweet' % (
+        (full_time - slim_time) * 1e6, full_size - slim_size)
+
+
+if __name__ == '__main__':
+    main()
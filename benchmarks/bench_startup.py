@@ -0,0 +1,105 @@
+'''
+Cold start of script.py: the time --help takes, and the time from launching
+an analysis of an archive to its first request reaching the server, which
+here is a socket that notes the time and hangs up
+
+    python benchmarks/bench_startup.py [--runs 10] [--budget 100]
+
+Exits with status 1 when the median time to the first request goes over
+the budget, in milliseconds, once the interpreter's own start is taken out.
+A first run, not timed, leaves the bytecode of the modules behind.
+'''
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import corpus
+
+SCRIPT = os.path.join(os.path.dirname(HERE), 'script.py')
+
+
+# as deployed, with the bytecode of the modules written by the first run
+ENV = dict(os.environ)
+ENV.pop('PYTHONDONTWRITEBYTECODE', None)
+
+
+def launch(args):
+    return subprocess.Popen([sys.executable] + args, stdout=open(os.devnull, 'w'),
+                            stderr=subprocess.STDOUT, env=ENV)
+
+
+def run_time(args):
+    ''' Seconds a run takes from launch to exit '''
+    start = time.time()
+    launch(args).wait()
+    return time.time() - start
+
+
+def first_request_time(archive):
+    ''' Seconds from launching an analysis to its first request '''
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    listener.settimeout(60)
+    start = time.time()
+    process = launch([SCRIPT, '--input', archive, '--server',
+                      '127.0.0.1:%d' % listener.getsockname()[1]])
+    try:
+        connection, _ = listener.accept()
+        connection.recv(1)
+        elapsed = time.time() - start
+        connection.close()
+        return elapsed
+    finally:
+        process.kill()
+        process.wait()
+        listener.close()
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the start of script.py')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=100.0,
+                        help='Milliseconds allowed to the first request, '
+                        'over the bare interpreter start')
+    args = parser.parse_args()
+
+    fd, archive = tempfile.mkstemp(suffix='.jsonl')
+    with os.fdopen(fd, 'w') as f:
+        for i, text in enumerate(corpus.tweets(100)):
+            f.write(json.dumps({'id': i, 'text': text}) + '\n')
+    try:
+        first_request_time(archive)
+        bare = [run_time(['-c', 'pass']) for _ in xrange(args.runs)]
+        help = [run_time([SCRIPT, '--help']) for _ in xrange(args.runs)]
+        first = [first_request_time(archive) for _ in xrange(args.runs)]
+    finally:
+        os.remove(archive)
+
+    interpreter = median(bare)
+    for name, times in (('python -c pass', bare), ('script.py --help', help),
+                        ('first request', first)):
+        print '%-18s median %7.1f ms  best %7.1f ms' % (
+            name, median(times) * 1e3, min(times) * 1e3)
+    over = (median(first) - interpreter) * 1e3
+    print 'first request, past the interpreter start: %.1f ms (budget %g ms)' % (over, args.budget)
+    if over > args.budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
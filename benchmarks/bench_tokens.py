@@ -0,0 +1,50 @@
+'''
+Token line parsing: the regex parse_bracketed against the split fast path,
+and eager against lazy words in parse_parser_results
+
+    python benchmarks/bench_tokens.py [--tweets 2000]
+'''
+import os
+import sys
+import timeit
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpus
+from analyzer.corenlp import parse_bracketed, _parse_bracketed, parse_parser_results
+
+def per_item(func, items):
+    start = timeit.default_timer()
+    for item in items:
+        func(item)
+    return (timeit.default_timer() - start) / len(items)
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark token line parsing')
+    parser.add_argument('--tweets', type=int, default=2000)
+    args = parser.parse_args()
+
+    groups = corpus.word_groups(args.tweets * 15)
+    for group in groups:
+        if parse_bracketed(group) != _parse_bracketed(group):
+            raise SystemExit('Mismatch on %r' % group)
+
+    regex = per_item(_parse_bracketed, groups)
+    fast = per_item(parse_bracketed, groups)
+    print 'regex parse_bracketed:  %6.2f us/token' % (regex * 1e6)
+    print 'split parse_bracketed:  %6.2f us/token  (%.1fx)' % (fast * 1e6, regex / fast)
+
+    outputs = [corpus.corenlp_output(text, i)
+               for i, text in enumerate(corpus.tweets(args.tweets))]
+    eager = per_item(parse_parser_results, outputs)
+    lazy = per_item(lambda output: parse_parser_results(output, lazy=True), outputs)
+    print 'eager words:            %6.1f us/tweet' % (eager * 1e6)
+    print 'lazy words:             %6.1f us/tweet  (%.1fx)' % (lazy * 1e6, eager / lazy)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Synthetic tweets and the CoreNLP shell output they would produce, so the
+benchmarks run without Twitter credentials or a CoreNLP install
+'''
+import random
+
+WORDS = ['the', 'movie', 'was', 'not', 'great', 'i', 'love', 'this', 'phone',
+         'never', 'again', 'battery', 'is', 'awful', 'today', 'really', 'new',
+         'camera', 'service', 'happy', 'with', 'my', 'order', 'terrible',
+         'delivery', 'amazing', 'show', 'last', 'night', 'so', 'bad']
+EXTRAS = [':)', ':(', ':D', 'gr8', 'lol', 'omg', 'b4', 'thx', '@someone',
+          'http://t.co/x1y2z3', 'www.example.com', '#Amazon', '#fail']
+LABELS = ['Very Negative', 'Negative', 'Neutral', 'Positive', 'Very Positive']
+TAGS = ['DT', 'NN', 'VBD', 'RB', 'JJ', 'PRP', 'VBP', 'IN', 'NNS', 'CC']
+NER = ['O', 'O', 'O', 'O', 'PERSON', 'ORGANIZATION', 'DATE']
+TIMEX = '<TIMEX3 tid="t1" type="DATE" value="2015-04-20">today</TIMEX3>'
+
+
+def tweets(count, seed=42):
+    ''' count tweet texts mixing words, slangs, emoticons, links and tags '''
+    rnd = random.Random(seed)
+    out = []
+    for _ in xrange(count):
+        tokens = [rnd.choice(WORDS) for _ in xrange(rnd.randint(6, 18))]
+        for _ in xrange(rnd.randint(0, 3)):
+            tokens.insert(rnd.randint(0, len(tokens)), rnd.choice(EXTRAS))
+        out.append(' '.join(tokens))
+    return out
+
+
+def word_line(words, rnd):
+    ''' The [Text=... ...] line of a sentence '''
+    tokens = []
+    offset = 0
+    for word in words:
+        tokens.append('[Text=%s CharacterOffsetBegin=%d CharacterOffsetEnd=%d '
+                      'PartOfSpeech=%s]' % (word, offset, offset + len(word),
+                                            rnd.choice(TAGS)))
+        offset += len(word) + 1
+    return ' '.join(tokens)
+
+
+def sentence_block(number, words, rnd, full=True):
+    ''' The shell output of one sentence, full or sentiment.properties '''
+    lines = ['Sentence #%d (%d tokens, sentiment: %s):' %
+             (number, len(words), rnd.choice(LABELS)),
+             ' '.join(words),
+             word_line(words, rnd)]
+    lines.append('(ROOT')
+    lines.append('  (S')
+    for word in words[:-1]:
+        lines.append('    (%s %s)' % (rnd.choice(TAGS), word))
+    lines.append('    (%s %s)))' % (rnd.choice(TAGS), words[-1]))
+    lines.append('')
+    if full:
+        lines.append('root(ROOT-0, %s-1)' % words[0])
+        for i, word in enumerate(words[1:]):
+            lines.append('dep(%s-1, %s-%d)' % (words[0], word, i + 2))
+        lines.append('')
+    return lines
+
+
+def corenlp_output(text, seed=0, full=True, sentence_length=12):
+    ''' What the shell prints for text, before its next prompt, with \\r\\n
+    line ends as read through the pty
+    '''
+    rnd = random.Random(seed)
+    words = text.split() or ['.']
+    lines = []
+    for n, start in enumerate(xrange(0, len(words), sentence_length)):
+        lines.extend(sentence_block(n + 1, words[start:start + sentence_length],
+                                    rnd, full))
+    return '\r\n'.join(lines)
+
+
+def word_groups(count, seed=7):
+    ''' Contents of [Text=...] groups as CoreNLP prints them with lemma and
+    ner on, one in fifty carrying a TIMEX3 XML value
+    '''
+    rnd = random.Random(seed)
+    groups = []
+    offset = 0
+    for _ in xrange(count):
+        word = rnd.choice(WORDS)
+        group = 'Text=%s CharacterOffsetBegin=%d CharacterOffsetEnd=%d ' \
+                'PartOfSpeech=%s Lemma=%s NamedEntityTag=%s' % (
+                    word, offset, offset + len(word), rnd.choice(TAGS),
+                    word, rnd.choice(NER))
+        if rnd.random() < 0.02:
+            group += ' NormalizedNamedEntityTag=2015-04-20 Timex=%s' % TIMEX
+        groups.append(group)
+        offset += len(word) + 1
+    return groups
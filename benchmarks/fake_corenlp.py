@@ -0,0 +1,53 @@
+'''
+Stand-in for the CoreNLP interactive shell: reads a line after each
+"NLP> " prompt and prints the canned output of corpus.corenlp_output for
+it, after an optional delay
+
+    python benchmarks/fake_corenlp.py [--latency 0.01] [--startup 30] [--sentiment-only]
+
+StanfordCoreNLP(command='python benchmarks/fake_corenlp.py') drives it
+like the real shell, and so does the server with --command.
+'''
+import os
+import sys
+import time
+import zlib
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus
+
+PROMPT = 'NLP> '
+
+
+def main():
+    parser = ArgumentParser(description='Fake CoreNLP shell')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds spent on each line before answering')
+    parser.add_argument('--startup', type=float, default=0.0,
+                        help='Seconds spent loading before the first prompt')
+    parser.add_argument('--sentiment-only', action='store_true',
+                        help='Answer like CoreNLP running sentiment.properties')
+    args = parser.parse_args()
+
+    time.sleep(args.startup)
+    sys.stdout.write('Entering interactive shell.\n' + PROMPT)
+    sys.stdout.flush()
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if args.latency:
+            time.sleep(args.latency)
+        if line:
+            output = corpus.corenlp_output(line, zlib.crc32(line),
+                                           full=not args.sentiment_only)
+            sys.stdout.write(output.replace('\r\n', '\n') + '\n')
+        sys.stdout.write(PROMPT)
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+'''
+Stand-in for the noslang.com dictionary: serves /dictionary/<slug> pages in
+its markup, built from a slang CSV, for slangs.py to refresh from
+
+    python benchmarks/fake_noslang.py [--port 8094] [--csv slangs_meaning.csv] [--latency 0.05]
+    python slangs.py --base-url http://localhost:8094/dictionary/
+
+Pages carry an ETag and a Last-Modified date and are answered with 304 Not
+Modified when they match the request's. Edit the CSV while it runs and the
+pages of the slangs that changed get new ones. Connections are kept alive.
+'''
+import os
+import sys
+import cgi
+import time
+import hashlib
+import threading
+import BaseHTTPServer
+import SocketServer
+from email.utils import formatdate, parsedate_tz, mktime_tz
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from normalizer import SLANGS_CSV, read_slangs_csv
+
+PREFIX = '/dictionary/'
+
+
+def slug_of(slang):
+    ''' The page a slang is on: its first letter, 1 for the others '''
+    first = slang[:1].lower()
+    return first if 'a' <= first <= 'z' else '1'
+
+
+def render(slangs):
+    ''' A dictionary page listing slangs, in noslang's markup '''
+    rows = ['<html><body><a name="top"></a><dl>']
+    for slang in sorted(slangs):
+        rows.append('<dt><a name="%s"></a><abbr title="%s">%s</abbr></dt>' % (
+            cgi.escape(slang, True), cgi.escape(slangs[slang], True), cgi.escape(slang)))
+    rows.append('</dl></body></html>')
+    return '\n'.join(rows)
+
+
+class Dictionary(object):
+    ''' The pages of a CSV, built again when it changes '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.pages = {}
+
+    def page(self, slug):
+        ''' (body, etag, last modified) of a page, None if there is none '''
+        with self.lock:
+            mtime = os.path.getmtime(self.path)
+            if mtime != self.mtime:
+                self._load(mtime)
+            return self.pages.get(slug)
+
+    def _load(self, mtime):
+        grouped = {}
+        for slang, meaning in read_slangs_csv(self.path).iteritems():
+            grouped.setdefault(slug_of(slang), {})[slang] = meaning
+        pages = {}
+        for slug, slangs in grouped.iteritems():
+            body = render(slangs)
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            old = self.pages.get(slug)
+            # a page keeps its date until it changes
+            modified = old[2] if old and old[1] == etag else int(mtime)
+            pages[slug] = (body, etag, modified)
+        self.pages = pages
+        self.mtime = mtime
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+        page = None
+        if self.path.startswith(PREFIX):
+            page = server.dictionary.page(self.path[len(PREFIX):].strip('/'))
+        if page is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body, etag, modified = page
+        if self.not_modified(etag, modified):
+            with server.lock:
+                server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(modified, usegmt=True))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_modified(self, etag, modified):
+        if 'If-None-Match' in self.headers:
+            return etag in [tag.strip() for tag in self.headers['If-None-Match'].split(',')]
+        since = self.headers.get('If-Modified-Since')
+        if since:
+            parsed = parsedate_tz(since)
+            return parsed is not None and mktime_tz(parsed) >= modified
+        return False
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class FakeNoslang(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, path=SLANGS_CSV, latency=0.0, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+        self.dictionary = Dictionary(path)
+        self.latency = latency
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests = self.not_modified = self.connections = 0
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], PREFIX)
+
+
+def main():
+    parser = ArgumentParser(description='Fake noslang.com dictionary')
+    parser.add_argument('-p', '--port', type=int, default=8094)
+    parser.add_argument('--csv', default=SLANGS_CSV,
+                        help='Slangs to serve, read again when it changes')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds spent on each request before answering')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeNoslang(('127.0.0.1', args.port), args.csv, args.latency, args.verbose)
+    print 'Serving %s at %s' % (args.csv, server.base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print '%d requests (%d not modified) over %d connections' % (
+        server.requests, server.not_modified, server.connections)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+'''
+Stand-in for the Twitter REST API: serves search/tweets and
+statuses/user_timeline from a synthetic timeline, paged with count, max_id
+and since_id like the real ones, for script.Tweets to fetch from
+
+    python benchmarks/fake_twitter.py [--port 8095] [--tweets 1000] [--latency 0.05]
+
+Tweets(domain='127.0.0.1:8095', secure=False) talks to it. The query
+parameters of every request are kept, to check how the client pages.
+'''
+import os
+import sys
+import json
+import time
+import urlparse
+import threading
+import BaseHTTPServer
+import SocketServer
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import corpus
+
+SEARCH = '/1.1/search/tweets.json'
+USER_TIMELINE = '/1.1/statuses/user_timeline.json'
+# tweets per page when the request does not say
+DEFAULT_COUNT = 15
+
+
+def timeline(count, seed=42):
+    ''' count tweets, newest first, with ids count down to 1 '''
+    texts = corpus.tweets(count, seed)
+    return [{'id': count - n, 'text': text.decode('utf-8')} for n, text in enumerate(texts)]
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        url = urlparse.urlparse(self.path)
+        params = dict(urlparse.parse_qsl(url.query))
+        with server.lock:
+            server.requests.append((url.path, params))
+        if url.path not in (SEARCH, USER_TIMELINE):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        page = server.page(int(params.get('count', DEFAULT_COUNT)),
+                           params.get('max_id'), params.get('since_id'))
+        body = json.dumps({'statuses': page} if url.path == SEARCH else page)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class FakeTwitter(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, tweets=1000, latency=0.0, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+        self.tweets = timeline(tweets) if isinstance(tweets, int) else tweets
+        self.latency = latency
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        # (path, query parameters) of every request
+        self.requests = []
+
+    def page(self, count, max_id=None, since_id=None):
+        ''' The newest count tweets with since_id < id <= max_id '''
+        page = []
+        for tweet in self.tweets:
+            if max_id is not None and tweet['id'] > int(max_id):
+                continue
+            if since_id is not None and tweet['id'] <= int(since_id):
+                break
+            page.append(tweet)
+            if len(page) == count:
+                break
+        return page
+
+    @property
+    def domain(self):
+        return '127.0.0.1:%d' % self.server_address[1]
+
+
+def main():
+    parser = ArgumentParser(description='Fake Twitter API')
+    parser.add_argument('-p', '--port', type=int, default=8095)
+    parser.add_argument('--tweets', type=int, default=1000,
+                        help='Tweets in the timeline')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds spent on each request before answering')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeTwitter(('127.0.0.1', args.port), args.tweets, args.latency, args.verbose)
+    print 'Serving %d tweets at %s' % (len(server.tweets), server.domain)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print '%d requests' % len(server.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+'''
+Load generator for the JSON-RPC server of analyzer/corenlp.py: replays a
+tweet corpus against parse, raw_parse or sentiment and reports throughput,
+failures and the latency distribution
+
+    python benchmarks/loadtest.py --clients 8 --duration 30
+    python benchmarks/loadtest.py --clients 16 --rate 40 --input tweets.jsonl.gz
+
+Without --rate, each client sends its next request as soon as the last
+one is answered (closed loop). With --rate, requests are due at a fixed
+rate whatever the answers (open loop) and their latency counts from when
+they were due, so the time spent waiting for a free client shows once the
+server can not keep up.
+'''
+import os
+import sys
+import json
+import math
+import time
+import Queue
+import socket
+import threading
+import itertools
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import jsonrpclib
+import corpus
+from sentiment import connect, is_busy
+
+METHODS = ('parse', 'raw_parse', 'sentiment')
+
+
+def load_texts(path, count):
+    if path is None:
+        return corpus.tweets(count)
+    from archive import read_tweets
+    return [tweet['text'] for tweet in read_tweets(path, limit=count)]
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+class Recorder(object):
+    ''' Latencies of the answered requests and counts of the failed ones '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = self.busy = self.timeouts = 0
+
+    def call(self, client, method, text, since):
+        try:
+            getattr(client, method)(text)
+        except socket.timeout:
+            outcome = 'timeouts'
+        except jsonrpclib.ProtocolError as e:
+            outcome = 'busy' if is_busy(e) else 'errors'
+        except Exception:
+            outcome = 'errors'
+        else:
+            outcome = None
+        latency = time.time() - since
+        with self.lock:
+            if outcome is None:
+                self.latencies.append(latency)
+            else:
+                setattr(self, outcome, getattr(self, outcome) + 1)
+        return outcome is None
+
+    def report(self, elapsed):
+        ordered = sorted(self.latencies)
+        return {'requests': len(ordered) + self.errors + self.busy + self.timeouts,
+                'ok': len(ordered), 'errors': self.errors, 'busy': self.busy,
+                'timeouts': self.timeouts, 'seconds': elapsed,
+                'throughput': len(ordered) / elapsed if elapsed else 0.0,
+                'p50': percentile(ordered, 0.50), 'p95': percentile(ordered, 0.95),
+                'p99': percentile(ordered, 0.99), 'max': ordered[-1] if ordered else 0.0,
+                'histogram': histogram(ordered)}
+
+
+def histogram(ordered, first=0.001, factor=2):
+    ''' Counts of latencies per bucket, buckets doubling from first seconds '''
+    buckets = []
+    bound = first
+    i = 0
+    while i < len(ordered):
+        count = 0
+        while i < len(ordered) and ordered[i] <= bound:
+            count += 1
+            i += 1
+        buckets.append((bound, count))
+        bound *= factor
+    return buckets
+
+
+def closed_loop(url, method, texts, clients, duration, recorder):
+    ''' clients threads sending their next request as soon as they can '''
+    next_text = itertools.cycle(texts).next
+    lock = threading.Lock()
+    stop = time.time() + duration
+
+    def client():
+        server = connect(url)
+        while time.time() < stop:
+            with lock:
+                text = next_text()
+            recorder.call(server, method, text, time.time())
+
+    run_clients(client, clients)
+
+
+def open_loop(url, method, texts, clients, duration, rate, recorder):
+    ''' Requests due every 1 / rate seconds, sent by the first free client '''
+    due = Queue.Queue()
+    done = object()
+
+    def client():
+        server = connect(url)
+        while True:
+            item = due.get()
+            if item is done:
+                return
+            since, text = item
+            recorder.call(server, method, text, since)
+
+    def schedule():
+        start = time.time()
+        for i, text in enumerate(itertools.cycle(texts)):
+            at = start + i / rate
+            if at >= start + duration:
+                break
+            time.sleep(max(0, at - time.time()))
+            due.put((at, text))
+        for _ in xrange(clients):
+            due.put(done)
+
+    scheduler = threading.Thread(target=schedule)
+    scheduler.daemon = True
+    scheduler.start()
+    run_clients(client, clients)
+
+
+def run_clients(client, clients):
+    threads = [threading.Thread(target=client) for _ in xrange(clients)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def print_report(report):
+    print 'requests %d: %d ok, %d errors, %d busy, %d timeouts in %.1fs' % (
+        report['requests'], report['ok'], report['errors'], report['busy'],
+        report['timeouts'], report['seconds'])
+    print 'throughput %.1f requests/s' % report['throughput']
+    print 'latency p50 %.1fms  p95 %.1fms  p99 %.1fms  max %.1fms' % tuple(
+        report[key] * 1000 for key in ('p50', 'p95', 'p99', 'max'))
+    buckets = list(itertools.dropwhile(lambda bucket: not bucket[1], report['histogram']))
+    most = max([count for bound, count in buckets] or [0])
+    for bound, count in buckets:
+        bar = '#' * int(round(40.0 * count / most)) if most else ''
+        print '  <= %8.1fms %7d %s' % (bound * 1000, count, bar)
+
+
+def main():
+    parser = ArgumentParser(description='Load test the CoreNLP JSON-RPC server')
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('-m', '--method', choices=METHODS, default='parse')
+    parser.add_argument('-c', '--clients', type=int, default=4,
+                        help='Concurrent connections')
+    parser.add_argument('-r', '--rate', type=float,
+                        help='Requests per second, open loop (default: closed loop)')
+    parser.add_argument('-d', '--duration', type=float, default=10.0,
+                        help='Seconds to send requests for')
+    parser.add_argument('-t', '--timeout', type=float, default=60.0,
+                        help='Seconds before a request counts as timed out')
+    parser.add_argument('-i', '--input', help='Archive of tweets to replay, '
+                        'one JSON tweet per line (default: synthetic tweets)')
+    parser.add_argument('--tweets', type=int, default=1000,
+                        help='Tweets of the corpus to replay')
+    parser.add_argument('--save', help='File to save the report to, as JSON')
+    args = parser.parse_args()
+
+    socket.setdefaulttimeout(args.timeout)
+    texts = load_texts(args.input, args.tweets)
+    recorder = Recorder()
+    start = time.time()
+    if args.rate:
+        open_loop(args.url, args.method, texts, args.clients, args.duration, args.rate, recorder)
+    else:
+        closed_loop(args.url, args.method, texts, args.clients, args.duration, recorder)
+    report = recorder.report(time.time() - start)
+    report.update({'method': args.method, 'clients': args.clients, 'rate': args.rate})
+
+    print_report(report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+'''
+The benchmark suite: times the hot paths on the synthetic corpus, with
+benchmarks/fake_corenlp.py standing in for CoreNLP, saves the timings as
+JSON and compares them with a saved baseline
+
+    python benchmarks/run.py --save baseline.json
+    python benchmarks/run.py --compare baseline.json [--tolerance 0.2]
+
+--compare exits with status 1 when a benchmark got slower than the
+baseline by more than the tolerance.
+'''
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import threading
+from argparse import ArgumentParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpus
+
+FAKE_CORENLP = '%s %s' % (sys.executable, os.path.join(HERE, 'fake_corenlp.py'))
+
+
+def per_op(func, items, repeat):
+    ''' Best of repeat runs of func over items, in seconds per item '''
+    best = None
+    for _ in xrange(repeat):
+        start = timeit.default_timer()
+        for item in items:
+            func(item)
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(items)
+
+
+def bench_pre_processing(texts, repeat):
+    from script import data_pre_processing
+    encoded = [text.encode('utf-8') for text in texts]
+    return per_op(data_pre_processing, encoded, repeat)
+
+
+def bench_parse_parser_results(texts, repeat):
+    from analyzer.corenlp import parse_parser_results
+    outputs = [corpus.corenlp_output(text, i) for i, text in enumerate(texts)]
+    return per_op(parse_parser_results, outputs, repeat)
+
+
+def bench_parse_bracketed(texts, repeat):
+    from analyzer.corenlp import parse_bracketed
+    return per_op(parse_bracketed, corpus.word_groups(len(texts) * 15), repeat)
+
+
+def bench_shell_round_trip(texts, repeat):
+    from analyzer.corenlp import StanfordCoreNLP
+    nlp = StanfordCoreNLP(command=FAKE_CORENLP)
+    try:
+        return per_op(nlp._parse, texts, repeat)
+    finally:
+        nlp.close()
+
+
+def bench_shell_batch(texts, repeat):
+    from analyzer.corenlp import StanfordCoreNLP
+    nlp = StanfordCoreNLP(command=FAKE_CORENLP)
+    try:
+        return per_op(nlp.raw_parse_batch, [texts], repeat) / len(texts)
+    finally:
+        nlp.close()
+
+
+def bench_jsonrpc(texts, repeat):
+    import jsonrpclib
+    from sentiment import Transport
+    from analyzer.corenlp import StanfordCoreNLPPool, ThreadedJSONRPCServer
+    nlp = StanfordCoreNLPPool(1, serving=True, command=FAKE_CORENLP)
+    server = ThreadedJSONRPCServer(('127.0.0.1', 0), logRequests=False)
+    server.register_function(nlp.parse)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        transport = Transport()
+        client = jsonrpclib.Server('http://127.0.0.1:%d' % server.server_address[1], transport=transport)
+        return per_op(lambda text: json.loads(client.parse(text)), texts, repeat)
+    finally:
+        transport.close()
+        server.shutdown()
+        server.server_close()
+        nlp.close()
+
+
+# name -> (function, tweets it runs on at most)
+BENCHMARKS = [
+    ('pre_processing', bench_pre_processing, None),
+    ('parse_parser_results', bench_parse_parser_results, None),
+    ('parse_bracketed', bench_parse_bracketed, None),
+    ('shell_round_trip', bench_shell_round_trip, None),
+    ('shell_batch', bench_shell_batch, None),
+    ('jsonrpc_parse', bench_jsonrpc, None),
+]
+
+
+def run(names, tweets, repeat):
+    texts = corpus.tweets(tweets)
+    results = {}
+    for name, func, most in BENCHMARKS:
+        if names and name not in names:
+            continue
+        seconds = func(texts[:most], repeat)
+        results[name] = {'us_per_op': seconds * 1e6}
+        print '%-22s %10.2f us/op' % (name, seconds * 1e6)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    ''' Prints the change of every benchmark against baseline, returns the
+    names of those slower by more than tolerance
+    '''
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before = baseline[name]['us_per_op']
+        after = results[name]['us_per_op']
+        change = after / before - 1
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print '%-22s %10.2f -> %10.2f us/op  %+6.1f%%%s' % (name, before, after, change * 100, flag)
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='Run the benchmark suite')
+    parser.add_argument('--tweets', type=int, default=1000,
+                        help='Size of the synthetic corpus')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of each benchmark, the best one is kept')
+    parser.add_argument('--only', action='append', default=[],
+                        choices=[name for name, func, most in BENCHMARKS],
+                        help='Only run this benchmark, can be repeated')
+    parser.add_argument('--save', help='File to save the results to, as JSON')
+    parser.add_argument('--compare', help='Baseline results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Slowdown over the baseline flagged as a regression')
+    args = parser.parse_args()
+
+    results = run(args.only, args.tweets, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.platform(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'tweets': args.tweets,
+                       'results': results}, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print '%d regression(s): %s' % (len(regressions), ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+'''
+Lexicon scoring of whole batches of tweets at once with NumPy, for
+backfills over archives too large to go through tweet by tweet
+'''
+import itertools
+import numpy as np
+
+import config
+from lexicon import NEGATION, INTENSIFIER, NEGATION_REACH
+
+# hashed token ids are this many bits wide
+BITS = 20
+# bytes of a token that are hashed, lexicon words must be shorter
+WIDTH = 24
+# stands between the tokens of two tweets in a batch
+SEPARATOR = '\x01'
+
+K1 = np.uint64(0x9E3779B97F4A7C15)
+K2 = np.uint64(0xC2B2AE3D27D4EB4F)
+
+LABELS = {2: 'Very Positive', 1: 'Positive', 0: 'Neutral', -1: 'Negative', -2: 'Very Negative'}
+
+
+class BulkScorer(object):
+    ''' Scores batches of pre processed tweets the way
+    lexicon.LexiconClassifier scores them one at a time.
+
+    A batch is split into tokens in one go and turned into an array of
+    fixed width byte strings, hashed (as is and lowercased) into BITS-bit
+    ids with a few vector operations. Along with the offsets of each tweet
+    they are the indices and indptr of a sparse tweets x ids matrix.
+    Polarities are read out of weight vectors indexed by id, negations and
+    intensifiers are applied from running indexes of where they were last
+    seen, and the weights are summed per tweet with bincount.
+
+    With about a hundred words in the lexicon, a word colliding with one
+    of them is a one in ten thousand event.
+    '''
+
+    def __init__(self, polarity=None, bits=BITS):
+        if polarity is None:
+            polarity = config.POLARITY
+        too_long = [word for word in polarity if len(word) >= WIDTH]
+        if too_long:
+            raise ValueError('Lexicon words must be shorter than %d bytes: %s' % (WIDTH, too_long))
+        self.shift = np.uint64(64 - bits)
+        self.exact = np.zeros(1 << bits)
+        self.lower = np.zeros(1 << bits)
+        words = list(polarity)
+        exact, lower = self.ids(words)
+        self.exact[exact] = [polarity[word] for word in words]
+        lowercase = [i for i, word in enumerate(words) if word == word.lower()]
+        self.lower[exact[lowercase]] = [polarity[words[i]] for i in lowercase]
+        self.negation = self.ids([NEGATION])[0][0]
+        self.intensifier = self.ids([INTENSIFIER])[0][0]
+
+    def _hash(self, words):
+        ''' BITS-bit ids of tokens given as rows of three 64-bit words '''
+        h = words[:, 0] * K1 + words[:, 1]
+        h = h * K1 + words[:, 2]
+        return ((h * K2) >> self.shift).astype(np.int64)
+
+    def ids(self, tokens):
+        ''' The ids of tokens, as is and lowercased '''
+        return self._ids(np.array(tokens, 'S%d' % WIDTH))
+
+    def _ids(self, codes):
+        rows = (len(codes), WIDTH // 8)
+        exact = self._hash(codes.view(np.uint64).reshape(rows))
+        letters = codes.view(np.uint8)
+        upper = (letters - np.uint8(ord('A'))) < 26
+        lowered = letters | (upper.view(np.uint8) << 5)
+        return exact, self._hash(lowered.view(np.uint64).reshape(rows))
+
+    def encode(self, texts):
+        ''' The ids of the tokens of all the texts, as is and lowercased,
+        and where the tokens of each text start and end in them
+        '''
+        codes = np.array((' %s ' % SEPARATOR).join(texts).split(), 'S%d' % WIDTH)
+        separators = np.flatnonzero(codes == SEPARATOR)
+        if len(separators) == len(texts) - 1:
+            lengths = np.diff(np.concatenate(([-1], separators, [len(codes)]))) - 1
+            codes = np.delete(codes, separators)
+        else:
+            # no texts, or one holding the separator itself
+            split = [text.split() for text in texts]
+            lengths = np.array(map(len, split), np.int64)
+            codes = np.array(list(itertools.chain.from_iterable(split)), 'S%d' % WIDTH)
+        indptr = np.zeros(len(texts) + 1, np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        exact, lower = self._ids(codes)
+        return exact, lower, indptr
+
+    def weights(self, exact_ids, lower_ids, indptr):
+        ''' The polarity of every token, negations and intensifiers applied '''
+        exact = self.exact[exact_ids]
+        weights = np.where(exact != 0, exact, self.lower[lower_ids])
+        polar = weights != 0
+        negation = ~polar & (lower_ids == self.negation)
+        intensifier = ~polar & (lower_ids == self.intensifier)
+
+        positions = np.arange(len(weights))
+        starts = np.repeat(indptr[:-1], np.diff(indptr))
+        # other tokens, those that use up the reach of a negation
+        counted = np.cumsum(~(polar | negation | intensifier))
+
+        # a negation flips the next polar token of its tweet, unless
+        # another one comes first or more than NEGATION_REACH - 1 other
+        # tokens are in between
+        before = last_before(positions, polar | negation)
+        flip = polar & (before >= starts)
+        flip[flip] = negation[before[flip]]
+        flip[flip] = counted[positions[flip]] - counted[before[flip]] < NEGATION_REACH
+
+        # an intensifier doubles the next polar token of its tweet
+        before = last_before(positions, polar | intensifier)
+        boost = polar & (before >= starts)
+        boost[boost] = intensifier[before[boost]]
+
+        weights[boost] *= 2
+        weights[flip] = -weights[flip] / 2.0
+        return weights
+
+    def score(self, texts):
+        ''' The score of each text and the weight of evidence behind it '''
+        exact_ids, lower_ids, indptr = self.encode(texts)
+        weights = self.weights(exact_ids, lower_ids, indptr)
+        rows = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        totals = np.bincount(rows, weights, len(texts))
+        evidence = np.bincount(rows, np.abs(weights), len(texts))
+        return totals, evidence
+
+    def values(self, totals):
+        ''' The sentiment.VALUES of the labels the scores stand for '''
+        return np.select([totals >= 4, totals > 0, totals <= -4, totals < 0],
+                         [2, 1, -2, -1], 0)
+
+
+def last_before(positions, mask):
+    ''' For every position, the last one before it where mask is set, -1
+    if there is none
+    '''
+    seen = np.maximum.accumulate(np.where(mask, positions, -1))
+    return np.concatenate(([-1], seen[:-1]))
+
+
+def process(tweets, normalizer, scorer=None, batch_size=10000, writer=None):
+    ''' The overall value of tweets by the lexicon alone, batch_size at a
+    time, each batch normalized in one go by normalizer.normalize_many the
+    way script.lexicon_pre_processing normalizes a tweet. See report for
+    the verdict, printed once writer is closed.
+    '''
+    if scorer is None:
+        scorer = BulkScorer()
+    tweets = iter(tweets)
+    overall = 0
+    for batch in iter(lambda: list(itertools.islice(tweets, batch_size)), []):
+        normalized = normalizer.normalize_many([tweet['text'].encode('utf-8') for tweet in batch],
+                                               kept=True)
+        usable = [(tweet, usable_tweet) for tweet, usable_tweet in zip(batch, normalized)
+                  if usable_tweet]
+        totals, evidence = scorer.score([usable_tweet for tweet, usable_tweet in usable])
+        values = scorer.values(totals)
+        overall += int(values.sum())
+
+        if writer is not None:
+            for (tweet, usable_tweet), value in zip(usable, values.tolist()):
+                writer.write({'id': tweet.get('id'), 'text': tweet['text'],
+                              'normalized': usable_tweet, 'label': LABELS[value],
+                              'value': value})
+    return overall
+
+
+def report(overall):
+    ''' The verdict on the overall value, as script.process prints it '''
+    return ['The overall sentiment of the recieved tweets is: ',
+            'Positive' if overall > 0 else 'Negative']
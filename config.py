@@ -25,3 +25,22 @@ EMOTICONS = {
         'v.v': 'Very Bad',
         ':|': 'Neutral',
 }
+
+# polarity of words for the lexicon first pass (lexicon.py), looked up
+# after pre processing, as is and then lowercased. The capitalized ones
+# are what emoticons are rewritten to, they weigh more than words.
+POLARITY = {
+        'Good': 2, 'Bad': -2,
+        'good': 1, 'great': 1, 'nice': 1, 'happy': 1, 'best': 2, 'better': 1,
+        'love': 2, 'loved': 2, 'loving': 2, 'like': 1, 'liked': 1,
+        'awesome': 2, 'amazing': 2, 'excellent': 2, 'fantastic': 2,
+        'wonderful': 2, 'cool': 1, 'fun': 1, 'beautiful': 1, 'thanks': 1,
+        'thank': 1, 'glad': 1, 'enjoy': 1, 'enjoyed': 1, 'win': 1,
+        'perfect': 2, 'laughing': 1, 'lol': 1, 'congrats': 1,
+        'bad': -1, 'worse': -1, 'worst': -2, 'hate': -2, 'hated': -2,
+        'awful': -2, 'terrible': -2, 'horrible': -2, 'sad': -1, 'angry': -1,
+        'poor': -1, 'sucks': -2, 'fail': -1, 'failed': -1, 'broken': -1,
+        'disappointed': -2, 'disappointing': -2, 'boring': -1, 'annoying': -1,
+        'ugly': -1, 'stupid': -1, 'wrong': -1, 'problem': -1, 'lost': -1,
+        'crap': -2, 'wtf': -1, 'sorry': -1,
+}
@@ -0,0 +1,116 @@
+'''
+A first pass at the sentiment of a tweet from its words alone, to spare
+corenlp the tweets whose sentiment is plain
+'''
+import random
+import config
+
+NEGATION = 'not'
+INTENSIFIER = 'very'
+# polar words a negation reaches
+NEGATION_REACH = 3
+
+
+class LexiconClassifier(object):
+    ''' Scores pre processed tweets with a polarity lexicon.
+
+    The score is the sum of the polarities of the words, a negation
+    flipping and halving the next polar word within reach (not bad is
+    only mildly good) and an intensifier doubling it; the tweets have to
+    be pre processed with the intensifier kept, see
+    script.lexicon_pre_processing. The confidence is how one sided the
+    evidence is, from 0 (none, or as much for as against) towards 1.
+    '''
+
+    def __init__(self, polarity=None):
+        if polarity is None:
+            polarity = config.POLARITY
+        self.polarity = polarity
+
+    def score(self, text):
+        ''' The score of text and the sum of the weights behind it '''
+        polarity = self.polarity
+        total = weight = 0
+        flip = 0
+        boost = False
+        for token in text.split():
+            value = polarity.get(token)
+            if value is None:
+                lower = token.lower()
+                if lower == NEGATION:
+                    flip = NEGATION_REACH
+                    continue
+                if lower == INTENSIFIER:
+                    boost = True
+                    continue
+                value = polarity.get(lower)
+                if value is None:
+                    if flip:
+                        flip -= 1
+                    continue
+            if boost:
+                value *= 2
+                boost = False
+            if flip:
+                value = -value / 2.0
+                flip = 0
+            total += value
+            weight += abs(value)
+        return total, weight
+
+    def classify(self, text):
+        ''' A label of sentiment.VALUES and the confidence in it '''
+        total, weight = self.score(text)
+        confidence = abs(total) / (weight + 1.0)
+        if total >= 4:
+            return 'Very Positive', confidence
+        elif total > 0:
+            return 'Positive', confidence
+        elif total <= -4:
+            return 'Very Negative', confidence
+        elif total < 0:
+            return 'Negative', confidence
+        return 'Neutral', confidence
+
+
+class Cascade(object):
+    ''' Decides which tweets the lexicon answers for and keeps count.
+
+    Tweets classified with at least threshold confidence are answered by
+    the lexicon, the others go on to corenlp. A sample fraction of those
+    answered goes to corenlp anyway, to measure how often both agree on
+    the polarity (positive, neutral or negative).
+    '''
+
+    def __init__(self, threshold=0.6, sample=0.0, classifier=None, seed=None):
+        self.threshold = threshold
+        self.sample = sample
+        self.classifier = classifier or LexiconClassifier()
+        self.random = random.Random(seed)
+        self.seen = self.answered = self.sampled = self.agreed = 0
+
+    def first_pass(self, text):
+        ''' The label of text if the lexicon is confident enough, else None '''
+        self.seen += 1
+        label, confidence = self.classifier.classify(text)
+        if confidence < self.threshold:
+            return None
+        self.answered += 1
+        return label
+
+    def should_sample(self):
+        return self.sample > 0 and self.random.random() < self.sample
+
+    def compare(self, label, corenlp_label, values):
+        ''' Counts one sampled tweet, values being sentiment.VALUES '''
+        self.sampled += 1
+        if cmp(values[label], 0) == cmp(values[corenlp_label], 0):
+            self.agreed += 1
+
+    def report(self):
+        lines = ['The lexicon answered %d of %d tweets (%.1f%%)' % (
+            self.answered, self.seen, 100.0 * self.answered / self.seen if self.seen else 0)]
+        if self.sampled:
+            lines.append('It agreed with corenlp on %d of %d sampled tweets (%.1f%%)' % (
+                self.agreed, self.sampled, 100.0 * self.agreed / self.sampled))
+        return lines
@@ -0,0 +1,155 @@
+'''
+Finds tweets already analyzed that a new one barely differs from, so their
+sentiment is reused instead of parsing it again
+'''
+import array
+import struct
+import hashlib
+
+from normalizer import URL_TOKEN, USER_TOKEN
+
+BITS = 64
+MASK = (1 << BITS) - 1
+HASH = struct.Struct('<Q')
+# tokens left out of fingerprints, see features
+PLACEHOLDERS = frozenset([URL_TOKEN, USER_TOKEN])
+
+
+def features(text):
+    ''' The words and pairs of consecutive words of a pre processed tweet,
+    but for the placeholders of links and user tags and the hashtags it
+    ends with: copies of a tweet mostly differ in those, which seldom carry
+    its sentiment
+    '''
+    words = [word for word in text.split() if word not in PLACEHOLDERS]
+    while words and words[-1].startswith('#'):
+        words.pop()
+    return words + [first + ' ' + second for first, second in zip(words, words[1:])]
+
+
+def simhash(features):
+    ''' 64 bit SimHash of features: each bit is set when it is set in the
+    hash of more than half the features
+
+    The hashes are added up bit by bit in binary, planes[k] holding bit k
+    of all 64 counts, so a feature costs a few operations on integers
+    rather than one per bit.
+    '''
+    planes = []
+    for feature in features:
+        carry, = HASH.unpack_from(hashlib.md5(feature).digest())
+        for k, plane in enumerate(planes):
+            planes[k] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        else:
+            planes.append(carry)
+
+    # the counts at least threshold, compared plane by plane from the top
+    threshold = len(features) // 2 + 1
+    if threshold >> len(planes):
+        return 0
+    greater = 0
+    equal = MASK
+    for k in reversed(xrange(len(planes))):
+        if threshold >> k & 1:
+            equal &= planes[k]
+        else:
+            greater |= equal & planes[k]
+            equal &= ~planes[k]
+    return greater | equal
+
+
+class NearDuplicates(object):
+    ''' The SimHash fingerprints of the last capacity tweets analyzed and
+    their sentiment, searched for one at most distance bits away.
+
+    The fingerprint is cut into distance + 1 bands: two within distance
+    bits of each other agree on at least one band, so only the tweets
+    sharing a band are compared. Fingerprints and labels are kept in a
+    ring, the oldest replaced once it is full, and the bands index the
+    ring by position in compact arrays, about 80MB at a million tweets.
+    '''
+
+    def __init__(self, distance=3, capacity=1000000):
+        if not 0 <= distance < BITS:
+            raise ValueError('distance must be between 0 and %d' % (BITS - 1))
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.distance = distance
+        self.capacity = capacity
+        count = distance + 1
+        bounds = [BITS * i // count for i in xrange(count + 1)]
+        # (band value -> positions in the ring, shift, mask) of every band
+        self.bands = [({}, low, (1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+        self.fingerprints = array.array('L')
+        self.labels = []
+        self.next = 0
+        self.seen = self.reused = self.evicted = 0
+
+    def fingerprint(self, text):
+        ''' The fingerprint of a pre processed tweet, None if there is
+        nothing in it to compare
+        '''
+        found = features(text)
+        if not found:
+            return None
+        return simhash(found)
+
+    def find(self, fingerprint):
+        ''' The label of a tweet at most distance bits from fingerprint,
+        None if there is none
+        '''
+        self.seen += 1
+        fingerprints = self.fingerprints
+        distance = self.distance
+        for table, shift, mask in self.bands:
+            positions = table.get(fingerprint >> shift & mask)
+            if positions is None:
+                continue
+            for position in positions:
+                if bin(fingerprints[position] ^ fingerprint).count('1') <= distance:
+                    self.reused += 1
+                    return self.labels[position]
+        return None
+
+    def add(self, fingerprint, label):
+        ''' Remember the label of a tweet, in place of the oldest one when
+        capacity are kept
+        '''
+        position = self.next
+        self.next = (position + 1) % self.capacity
+        if position < len(self.labels):
+            self._forget(position)
+            self.fingerprints[position] = fingerprint
+            self.labels[position] = label
+        else:
+            self.fingerprints.append(fingerprint)
+            self.labels.append(label)
+        for table, shift, mask in self.bands:
+            key = fingerprint >> shift & mask
+            positions = table.get(key)
+            if positions is None:
+                positions = table[key] = array.array('i')
+            positions.append(position)
+
+    def _forget(self, position):
+        fingerprint = self.fingerprints[position]
+        for table, shift, mask in self.bands:
+            key = fingerprint >> shift & mask
+            positions = table[key]
+            positions.remove(position)
+            if not positions:
+                del table[key]
+        self.evicted += 1
+
+    def __len__(self):
+        return len(self.labels)
+
+    def report(self):
+        return ['Near duplicates reused the sentiment of %d of %d tweets (%.1f%%), '
+                'sparing as many parses' % (
+                    self.reused, self.seen, 100.0 * self.reused / self.seen if self.seen else 0),
+                '%d tweets kept within %d bits, %d forgotten' % (
+                    len(self), self.distance, self.evicted)]
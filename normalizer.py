@@ -0,0 +1,435 @@
+import os
+import csv
+import mmap
+import zlib
+import struct
+import itertools
+import collections
+import config
+from phrases import PhraseMatcher
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SLANGS_CSV = os.path.join(HERE, 'slangs_meaning.csv')
+# compiled from the CSV by python slangs.py --build
+SLANGS_TABLE = os.path.join(HERE, 'slangs_meaning.table')
+
+# TweetNormalizer built from the table, also by python slangs.py --build
+NORMALIZER_SNAPSHOT = os.path.join(HERE, 'slangs_meaning.normalizer')
+SNAPSHOT_VERSION = 3
+SNAPSHOT_MAGIC = 'NORMAL3\n'
+# magic, version, checksum, phrases, offsets of the lexicon and the matcher
+SNAPSHOT_HEADER = struct.Struct('<8sIIIII')
+
+TABLE_MAGIC = 'SLANGS1\n'
+TABLE_HEADER = struct.Struct('<8sII')
+SPAN = struct.Struct('<II')
+SLOT = struct.Struct('<I')
+
+NEGATIONS = frozenset(['not', 'no', 'never', 'n\'t', 'cannot'])
+URL_PREFIXES = ('http', 'www')
+URL_TOKEN = '||U||'
+USER_TOKEN = '||T||'
+NEGATION_TOKEN = 'NOT'
+# stopwords the lexicon.LexiconClassifier and bulk.BulkScorer score by (the
+# intensifier), kept in the tweets normalized for them only, so what goes
+# to corenlp and its cache keys stay the same
+KEPT = frozenset(['very'])
+# rewrite of the tokens dropped, in a normalizer's lexicon
+DROPPED = '\x00'
+# tokens whose rewrite a normalizer remembers, before starting over
+REWRITES = 100000
+# tokens normalize_many remembers the rewrites of, before starting over
+PIECES = 100000
+
+
+def load_slangs(path=SLANGS_CSV, table=SLANGS_TABLE):
+    ''' The slang -> meaning table scraped by slangs.py: the compiled table
+    when there is one at least as recent as the CSV, else the CSV itself
+    '''
+    try:
+        if table and os.path.getmtime(table) >= os.path.getmtime(path):
+            return SlangTable(table)
+    except (OSError, ValueError):
+        pass
+    return read_slangs_csv(path)
+
+
+def read_slangs_csv(path=SLANGS_CSV):
+    ''' Read the CSV written by slangs.py, skipping the header rows
+    repeated in it. A slang listed twice keeps its last meaning.
+    '''
+    slangs = {}
+    with open(path, 'r') as sf:
+        reader = csv.DictReader(sf)
+        for row in reader:
+            if row['slang'] == 'slang' and row['meaning'] == 'meaning':
+                continue
+            slangs[row['slang']] = row['meaning']
+    return slangs
+
+
+def write_slang_table(slangs, path=SLANGS_TABLE):
+    ''' Compile slangs into the file SlangTable reads, see pack_table.
+    Replaces path atomically.
+    '''
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(pack_table(slangs))
+    os.rename(tmp, path)
+
+
+def pack_table(slangs):
+    ''' slangs as the bytes SlangTable reads: a header, the offsets of
+    every slang and meaning, a hash index of the slangs, then the slangs
+    in sorted order, each followed by its meaning
+    '''
+    ordered = sorted(slangs)
+    offsets = []
+    strings = []
+    end = 0
+    for slang in ordered:
+        for string in (slang, slangs[slang]):
+            offsets.append(end)
+            strings.append(string)
+            end += len(string)
+    offsets.append(end)
+
+    # open addressing, at most half full; slot holds 1 + the slang number
+    slots = 1
+    while slots < 2 * len(ordered):
+        slots *= 2
+    index = [0] * slots
+    for i, slang in enumerate(ordered):
+        slot = zlib.crc32(slang) & (slots - 1)
+        while index[slot]:
+            slot = (slot + 1) & (slots - 1)
+        index[slot] = i + 1
+
+    return ''.join([TABLE_HEADER.pack(TABLE_MAGIC, len(ordered), slots),
+                    struct.pack('<%dI' % len(offsets), *offsets),
+                    struct.pack('<%dI' % slots, *index)] + strings)
+
+
+class SlangTable(collections.Mapping):
+    ''' Read-only slang -> meaning mapping over a file compiled by
+    write_slang_table.
+
+    The file is memory mapped rather than read: opening it costs a few
+    system calls whatever its size, and the processes of a pool all map
+    the same pages of the page cache. A lookup hashes the slang into the
+    index stored in the file, a few microseconds.
+
+    A table packed at offset in data already mapped, such as the lexicon
+    of a normalizer snapshot, is read the same way.
+    '''
+
+    def __init__(self, path=SLANGS_TABLE, data=None, offset=0):
+        if data is None:
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = data
+        self.offset = offset
+        magic, self.count, self.slots = TABLE_HEADER.unpack_from(data, offset)
+        if magic != TABLE_MAGIC:
+            raise ValueError('%s is not a compiled slang table' % path)
+        self.offsets = offset + TABLE_HEADER.size
+        self.index = self.offsets + 4 * (2 * self.count + 1)
+        self.base = self.index + 4 * self.slots
+
+    def _string(self, i):
+        ''' The i-th string of the table, slangs are even and meanings odd '''
+        start, end = SPAN.unpack_from(self.data, self.offsets + 4 * i)
+        return self.data[self.base + start:self.base + end]
+
+    def __getitem__(self, slang):
+        data = self.data
+        mask = self.slots - 1
+        slot = zlib.crc32(slang) & mask
+        while True:
+            i, = SLOT.unpack_from(data, self.index + 4 * slot)
+            if not i:
+                raise KeyError(slang)
+            if self._string(2 * i - 2) == slang:
+                return self._string(2 * i - 1)
+            slot = (slot + 1) & mask
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return itertools.islice(self._strings(), 0, None, 2)
+
+    def iteritems(self):
+        strings = self._strings()
+        return itertools.izip(strings, strings)
+
+    def _strings(self):
+        offsets = struct.unpack_from('<%dI' % (2 * self.count + 1), self.data,
+                                     self.offsets)
+        strings = self.data[self.base:self.base + offsets[-1]]
+        return iter([strings[start:end] for start, end in
+                     itertools.izip(offsets, offsets[1:])])
+
+
+def snapshot_key(slangs, emoticons, stop, phrases):
+    ''' What a normalizer snapshot is built from, None unless slangs is a
+    SlangTable: a checksum of the table, the emoticons and the stopwords
+    '''
+    if not isinstance(slangs, SlangTable):
+        return None
+    key = zlib.crc32(slangs.data[:])
+    key = zlib.crc32(repr(sorted(emoticons.iteritems())), key)
+    key = zlib.crc32(repr(sorted(stop)), key)
+    return (SNAPSHOT_VERSION, key & 0xFFFFFFFF, int(bool(phrases)))
+
+
+def load_stopwords(language='english'):
+    ''' The nltk stopword list as a set, for O(1) membership tests. The
+    english one comes from the snapshot in stopwords.py, without nltk.
+    '''
+    if language == 'english':
+        from stopwords import ENGLISH
+        return ENGLISH
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words(language))
+
+
+class TweetNormalizer(object):
+    ''' Rewrites a tweet in a single pass over its tokens.
+
+    Every step of script.data_pre_processing (slangs, emoticons, links,
+    user tags, negations and stopwords) is resolved with hash lookups
+    instead of scanning the lexicons for each token. The rewrite of every
+    slang and emoticon is worked out once, when the normalizer is built,
+    or mapped from the snapshot slangs.py --build saves along with the
+    slang table: its lexicon is a SlangTable and its matcher a
+    phrases.MappedTrie, read in place like the table, so loading it costs
+    the same whatever their size. The rewrites of the tokens met are
+    remembered as they go, up to REWRITES of them. Multi-word slangs and
+    emoticons glued to words or to each other are split out as tokens of
+    their own first, see phrases.PhraseMatcher.
+    '''
+
+    def __init__(self, slangs=None, emoticons=None, stop=None, phrases=True,
+                 snapshot=NORMALIZER_SNAPSHOT):
+        if slangs is None:
+            slangs = load_slangs()
+        if emoticons is None:
+            emoticons = config.EMOTICONS
+        if stop is None:
+            stop = load_stopwords()
+
+        self.slangs = slangs
+        self.emoticons = emoticons
+        self.stop = frozenset(stop)
+        self.key = snapshot_key(slangs, emoticons, self.stop, phrases)
+        # token -> final rewrite, None when it is dropped
+        self.rewrites = {}
+        # token -> its final rewrites, as split by the matcher, and the
+        # phrases with a space it may open and close, see normalize_many
+        self.pieces = {}
+        self.spans = None
+        if snapshot and self._load(snapshot):
+            return
+
+        # token -> final rewrite, DROPPED when the rewrite is a stopword
+        self.lexicon = {}
+        for token in set(slangs) | set(emoticons):
+            rewrite = self._rewrite(token)
+            self.lexicon[token] = DROPPED if rewrite is None else rewrite
+
+        # finds multi-word slangs and glued emoticons, None to only
+        # rewrite whole tokens
+        self.matcher = None
+        if phrases:
+            self.matcher = PhraseMatcher(slangs, emoticons)
+
+    def _load(self, path):
+        ''' Map the lexicon and matcher of a snapshot built from the same
+        slang table, emoticons and stopwords, if there is one
+        '''
+        if self.key is None:
+            return False
+        try:
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return False
+        if len(data) < SNAPSHOT_HEADER.size:
+            data.close()
+            return False
+        header = SNAPSHOT_HEADER.unpack_from(data)
+        if header[0] != SNAPSHOT_MAGIC or header[1:4] != self.key:
+            data.close()
+            return False
+        lexicon, matcher = header[4:]
+        self.lexicon = SlangTable(path, data, lexicon)
+        self.matcher = PhraseMatcher.mapped(data, matcher) if matcher else None
+        return True
+
+    def save(self, path=NORMALIZER_SNAPSHOT):
+        ''' Snapshot the lexicon and matcher, for normalizers built from
+        the same slang table to map instead of working them out: a
+        header, the lexicon as a slang table, then the packed trie of the
+        matcher, if there is one
+        '''
+        if self.key is None:
+            raise ValueError('Only normalizers of a compiled slang table can be saved')
+        lexicon = pack_table(self.lexicon)
+        matcher = '' if self.matcher is None else self.matcher.pack()
+        version, key, phrases = self.key
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version, key, phrases,
+                                      SNAPSHOT_HEADER.size,
+                                      SNAPSHOT_HEADER.size + len(lexicon) if matcher else 0)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.write(lexicon)
+            f.write(matcher)
+        os.rename(tmp, path)
+
+    def resolve_slang(self, token):
+        ''' Follow slangs whose meaning is itself a slang (ayte -> alright ->
+        all right) until the meaning is plain text
+        '''
+        seen = set()
+        while token in self.slangs and token not in seen:
+            seen.add(token)
+            token = self.slangs[token]
+        return token
+
+    def _rewrite(self, token):
+        ''' The full rewrite chain for one token, in the original order '''
+        token = self.resolve_slang(token)
+        token = self.emoticons.get(token, token)
+        if token.startswith(URL_PREFIXES):
+            return URL_TOKEN
+        elif token.startswith('@'):
+            return USER_TOKEN
+        elif token in NEGATIONS:
+            return NEGATION_TOKEN
+        elif token in self.stop:
+            return None
+        return token
+
+    def _lookup(self, token):
+        ''' The final rewrite of token, None when it is dropped, remembered
+        for next time
+        '''
+        rewrite = self.lexicon.get(token)
+        if rewrite is not None:
+            if rewrite == DROPPED:
+                rewrite = None
+        elif token.startswith(URL_PREFIXES):
+            rewrite = URL_TOKEN
+        elif token.startswith('@'):
+            rewrite = USER_TOKEN
+        elif token in NEGATIONS:
+            rewrite = NEGATION_TOKEN
+        elif token not in self.stop:
+            rewrite = token
+        if len(self.rewrites) >= REWRITES:
+            self.rewrites.clear()
+        self.rewrites[token] = rewrite
+        return rewrite
+
+    def normalize(self, tweet, kept=False):
+        ''' Same contract as script.data_pre_processing. With kept, the
+        stopwords of KEPT stay in the tweet
+        '''
+        if tweet == ' ':
+            return None
+
+        rewrites = self.rewrites
+        lookup = self._lookup
+        tokens = []
+        if self.matcher is None:
+            split = tweet.split(' ')
+        else:
+            split = self.matcher.tokens(tweet)
+        for token in split:
+            try:
+                rewrite = rewrites[token]
+            except KeyError:
+                rewrite = lookup(token)
+            if rewrite is not None:
+                tokens.append(rewrite)
+            elif kept and token in KEPT:
+                tokens.append(token)
+
+        if not tokens:
+            return ''
+        return ' ' + '  '.join(tokens) + ' '
+
+    def normalize_many(self, tweets, kept=False):
+        ''' Normalize a batch of tweets, keeping their order.
+
+        Only phrases with a space in them run from one token into the
+        next, so the matcher is run over each token on its own, the first
+        time it is met, rather than over every character of every tweet.
+        A token is remembered along with its final rewrites and the
+        phrases with a space it may open or close; the tweets where one
+        may run across two tokens, few of them, are normalized whole.
+        '''
+        if self.matcher is None:
+            return [self.normalize(tweet, kept) for tweet in tweets]
+        if self.spans is None:
+            self.spans = self._spans()
+        normalize = self.normalize
+        pieces = self.pieces
+        split = self._split
+        which = 1 if kept else 0
+        normalized = []
+        for tweet in tweets:
+            if tweet == ' ':
+                normalized.append(None)
+                continue
+            tokens = []
+            opened = None
+            for token in tweet.split(' '):
+                try:
+                    found = pieces[token]
+                except KeyError:
+                    found = split(token)
+                if opened and not opened.isdisjoint(found[3]):
+                    normalized.append(normalize(tweet, kept))
+                    break
+                opened = found[2]
+                tokens.extend(found[which])
+            else:
+                normalized.append(' ' + '  '.join(tokens) + ' ' if tokens else '')
+        return normalized
+
+    def _spans(self):
+        ''' What comes before and after the first space of every phrase with
+        a space in it
+        '''
+        phrases = itertools.chain(self.slangs, self.emoticons)
+        return [tuple(phrase.split(' ', 1)) for phrase in phrases if ' ' in phrase]
+
+    def _split(self, token):
+        ''' The final rewrites of token split by the matcher, without and
+        with the stopwords of KEPT, and the phrases with a space it may
+        open (it ends with what comes before the space) and close (it
+        starts with what comes after it), remembered for next time
+        '''
+        plain = []
+        kept = []
+        for piece in self.matcher.tokens(token):
+            rewrite = self.rewrites.get(piece, DROPPED)
+            if rewrite is DROPPED:
+                rewrite = self._lookup(piece)
+            if rewrite is not None:
+                plain.append(rewrite)
+                kept.append(rewrite)
+            elif piece in KEPT:
+                kept.append(piece)
+        spans = self.spans
+        found = (plain, kept,
+                 frozenset(i for i, (head, tail) in enumerate(spans) if token.endswith(head)),
+                 frozenset(i for i, (head, tail) in enumerate(spans)
+                           if token.startswith(tail.split(' ', 1)[0])))
+        if len(self.pieces) >= PIECES:
+            self.pieces.clear()
+        self.pieces[token] = found
+        return found
@@ -0,0 +1,348 @@
+'''
+Finds the slangs and emoticons of a tweet in one pass over its text,
+multi-word slangs and emoticons glued to words (great:), :):)) included
+'''
+import struct
+import collections
+
+SLANG = 0
+EMOTICON = 1
+
+# flags of the phrase ending at a state, in a packed trie
+_EMOTICON = 1
+_LEFT = 2
+_RIGHT = 4
+
+TRIE_MAGIC = 'PHRASES1'
+# magic, states, slots of the transition index, emoticon starts, size in bytes
+TRIE_HEADER = struct.Struct('<8sIIII')
+EDGE = struct.Struct('<II')
+STATE = struct.Struct('<I')
+LENGTH = struct.Struct('<H')
+FLAGS = struct.Struct('<B')
+
+
+def _slot(key, shift):
+    ''' Where a transition, (state << 8 | character) + 1, is first looked
+    for in a packed index of 1 << (32 - shift) slots
+    '''
+    return (key * 2654435761 & 0xFFFFFFFF) >> shift
+
+
+class Trie(object):
+    ''' The trie of the phrases, with the failure link of every state and
+    its dictionary link: the nearest state down its failure links a phrase
+    ends at. Built in memory, see pack for the form MappedTrie reads.
+    '''
+
+    def __init__(self, slangs=(), emoticons=()):
+        self.edges = [{}]
+        # (length, kind, bounded on the left, bounded on the right) of the
+        # phrase ending at each state
+        self.phrases = [None]
+        for slang in slangs:
+            if slang:
+                self._add(' ' + slang, (len(slang), SLANG, False, False))
+        for emoticon in emoticons:
+            if emoticon:
+                self._add(emoticon, (len(emoticon), EMOTICON,
+                                     emoticon[0].isalnum(), emoticon[-1].isalnum()))
+        self.emoticon_starts = frozenset(emoticon[0] for emoticon in emoticons if emoticon)
+        self._link()
+
+    def _add(self, phrase, found):
+        edges = self.edges
+        state = 0
+        for ch in phrase:
+            following = edges[state].get(ch)
+            if following is None:
+                following = edges[state][ch] = len(edges)
+                edges.append({})
+                self.phrases.append(None)
+            state = following
+        self.phrases[state] = found
+
+    def _link(self):
+        ''' Failure and dictionary links, breadth first '''
+        edges = self.edges
+        phrases = self.phrases
+        fails = self.fails = [0] * len(edges)
+        links = self.links = [0] * len(edges)
+        queue = collections.deque(edges[0].itervalues())
+        while queue:
+            state = queue.popleft()
+            fallback = fails[state]
+            links[state] = fallback if phrases[fallback] is not None else links[fallback]
+            for ch, following in edges[state].iteritems():
+                if state:
+                    fallback = fails[state]
+                    while fallback and ch not in edges[fallback]:
+                        fallback = fails[fallback]
+                    fails[following] = edges[fallback].get(ch, 0)
+                queue.append(following)
+
+    def goto(self, state, ch):
+        return self.edges[state].get(ch)
+
+    def fail(self, state):
+        return self.fails[state]
+
+    def link(self, state):
+        return self.links[state]
+
+    def phrase(self, state):
+        return self.phrases[state]
+
+    def pack(self):
+        ''' The trie as the bytes MappedTrie reads: a header, the failure
+        link, dictionary link, phrase length and flags of every state, a
+        hash index of the transitions, then the characters emoticons
+        start with
+        '''
+        count = len(self.edges)
+        lengths = [0] * count
+        flags = [0] * count
+        for state, found in enumerate(self.phrases):
+            if found is not None:
+                length, kind, left, right = found
+                lengths[state] = length
+                flags[state] = (kind == EMOTICON and _EMOTICON) | (left and _LEFT) | \
+                    (right and _RIGHT)
+
+        # open addressing, at most half full
+        transitions = [((state << 8 | ord(ch)) + 1, following)
+                       for state, edges in enumerate(self.edges)
+                       for ch, following in edges.iteritems()]
+        shift = 32
+        while 1 << (32 - shift) < 2 * len(transitions):
+            shift -= 1
+        mask = (1 << (32 - shift)) - 1
+        index = [0] * (2 << (32 - shift))
+        for key, following in transitions:
+            slot = _slot(key, shift)
+            while index[2 * slot]:
+                slot = (slot + 1) & mask
+            index[2 * slot] = key
+            index[2 * slot + 1] = following
+
+        starts = ''.join(sorted(self.emoticon_starts))
+        body = ''.join([struct.pack('<%dI' % count, *self.fails),
+                        struct.pack('<%dI' % count, *self.links),
+                        struct.pack('<%dH' % count, *lengths),
+                        struct.pack('<%dB' % count, *flags),
+                        struct.pack('<%dI' % len(index), *index),
+                        starts])
+        return TRIE_HEADER.pack(TRIE_MAGIC, count, mask + 1, len(starts),
+                                TRIE_HEADER.size + len(body)) + body
+
+
+class MappedTrie(object):
+    ''' Read-only Trie over the bytes of Trie.pack, at offset in data,
+    typically a memory mapped file: nothing is decoded until it is looked
+    up, so opening it costs nothing whatever the number of phrases
+    '''
+
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+        magic, count, slots, starts, self.size = TRIE_HEADER.unpack_from(data, offset)
+        if magic != TRIE_MAGIC:
+            raise ValueError('Not a packed phrase trie')
+        self.fails = offset + TRIE_HEADER.size
+        self.links = self.fails + 4 * count
+        self.lengths = self.links + 4 * count
+        self.flags = self.lengths + 2 * count
+        self.index = self.flags + count
+        self.mask = slots - 1
+        self.shift = 32 - self.mask.bit_length()
+        end = self.index + 8 * slots
+        self.emoticon_starts = frozenset(data[end:end + starts])
+
+    def goto(self, state, ch):
+        code = ord(ch)
+        if code > 0xFF:
+            return None
+        key = (state << 8 | code) + 1
+        slot = _slot(key, self.shift)
+        while True:
+            found, following = EDGE.unpack_from(self.data, self.index + 8 * slot)
+            if found == key:
+                return following
+            if not found:
+                return None
+            slot = (slot + 1) & self.mask
+
+    def fail(self, state):
+        return STATE.unpack_from(self.data, self.fails + 4 * state)[0]
+
+    def link(self, state):
+        return STATE.unpack_from(self.data, self.links + 4 * state)[0]
+
+    def phrase(self, state):
+        length, = LENGTH.unpack_from(self.data, self.lengths + 2 * state)
+        if not length:
+            return None
+        flags, = FLAGS.unpack_from(self.data, self.flags + state)
+        return (length, EMOTICON if flags & _EMOTICON else SLANG,
+                bool(flags & _LEFT), bool(flags & _RIGHT))
+
+    def pack(self):
+        return self.data[self.offset:self.offset + self.size]
+
+
+class PhraseMatcher(object):
+    ''' Aho-Corasick automaton over the slangs and emoticons.
+
+    Every character of the text takes one transition, whatever the number
+    of phrases: transitions are worked out from the trie and its failure
+    links the first time they are taken, then looked up, and so are the
+    phrases ending at the state they lead to. The trie is built from the
+    phrases, or mapped from the one packed into a normalizer snapshot, see
+    MappedTrie.
+
+    A slang has to stand on its own, with a space, the end of the text or
+    an emoticon on each side. It goes into the automaton after a space and
+    the text is scanned after one, so slangs are only found at the start
+    of words; those right after an emoticon are looked up in the trie from
+    there. An emoticon can be glued to anything, except where its first or
+    last character is a letter or digit, which must not run into another
+    one (C: or :D are not matched in ABC: or :Do). Overlapping phrases are
+    settled leftmost first, then longest.
+    '''
+
+    def __init__(self, slangs=(), emoticons=(), trie=None):
+        self.trie = Trie(slangs, emoticons) if trie is None else trie
+        self.emoticon_starts = self.trie.emoticon_starts
+        # transitions taken so far, state -> character -> state, and all
+        # the phrases ending at the states they lead to, its own and those
+        # down its dictionary links
+        self.delta = {}
+        self.out = {0: ()}
+
+    @classmethod
+    def mapped(cls, data, offset=0):
+        ''' The matcher of a trie packed at offset in data, see Trie.pack '''
+        return cls(trie=MappedTrie(data, offset))
+
+    def pack(self):
+        return self.trie.pack()
+
+    def _step(self, state, ch):
+        ''' The transition from state on ch, remembered for next time '''
+        trie = self.trie
+        following = trie.goto(state, ch)
+        if following is None:
+            following = self._step(trie.fail(state), ch) if state else 0
+        self.delta.setdefault(state, {})[ch] = following
+        if following not in self.out:
+            hits = []
+            found = following
+            while found:
+                phrase = trie.phrase(found)
+                if phrase is not None:
+                    hits.append(phrase)
+                found = trie.link(found)
+            self.out[following] = tuple(hits)
+        return following
+
+    def find(self, text):
+        ''' (start, end) of the phrases found in text, in order '''
+        delta = self.delta
+        out = self.out
+        step = self._step
+        emoticon_starts = self.emoticon_starts
+        size = len(text)
+        longest = {}
+        # where emoticons start, and where they end inside the text
+        emoticons = set()
+        glued = []
+        # slangs glued on the right to what may be an emoticon
+        pending = []
+
+        state = 0
+        # end is where the character ends in text, in ' ' + text it is
+        # the index of the character
+        for end, ch in enumerate(' ' + text):
+            try:
+                state = delta[state][ch]
+            except KeyError:
+                state = step(state, ch)
+            hits = out[state]
+            if not hits:
+                continue
+            for length, kind, left, right in hits:
+                start = end - length
+                if kind == EMOTICON:
+                    if left and start and text[start - 1].isalnum():
+                        continue
+                    if right and end < size and text[end].isalnum():
+                        continue
+                    emoticons.add(start)
+                    if end < size:
+                        glued.append(end)
+                elif end < size and text[end] != ' ':
+                    if text[end] in emoticon_starts:
+                        pending.append((start, end))
+                    continue
+                if longest.get(start, -1) < end:
+                    longest[start] = end
+
+        for start in glued:
+            self._walk(text, start, longest, pending)
+        for start, end in pending:
+            if end in emoticons and longest.get(start, -1) < end:
+                longest[start] = end
+
+        matches = []
+        reached = 0
+        for start in sorted(longest):
+            if start >= reached:
+                reached = longest[start]
+                matches.append((start, reached))
+        return matches
+
+    def _walk(self, text, start, longest, pending):
+        ''' The slangs starting at start, right after an emoticon, from the
+        trie: those followed by a space or the end of the text go into
+        longest, those followed by what may be an emoticon into pending
+        '''
+        trie = self.trie
+        size = len(text)
+        state = trie.goto(0, ' ')
+        end = start
+        while state is not None and end < size:
+            state = trie.goto(state, text[end])
+            end += 1
+            if state is None:
+                continue
+            found = trie.phrase(state)
+            if found is None or found[1] != SLANG:
+                continue
+            if end == size or text[end] == ' ':
+                if longest.get(start, -1) < end:
+                    longest[start] = end
+            elif text[end] in self.emoticon_starts:
+                pending.append((start, end))
+
+    def tokens(self, text):
+        ''' text.split(' '), with every phrase found a token of its own '''
+        matches = self.find(text)
+        if not matches:
+            return text.split(' ')
+        tokens = []
+        reached = 0
+        for start, end in matches:
+            gap = text[reached:start].split(' ')
+            # the separators next to a phrase are not tokens
+            if reached and not gap[0]:
+                del gap[0]
+            if gap and not gap[-1]:
+                del gap[-1]
+            tokens.extend(gap)
+            tokens.append(text[start:end])
+            reached = end
+        gap = text[reached:].split(' ')
+        if not gap[0]:
+            del gap[0]
+        tokens.extend(gap)
+        return tokens
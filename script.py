@@ -1,18 +1,33 @@
-import csv
-import nltk
-import twitter
-import collections
+import os
+import sys
+import Queue
+import itertools
+import threading
+import time
 from argparse import ArgumentParser
-from twitter import Twitter, auth, OAuth
-from nltk.corpus import stopwords
-from sentiment import StanfordNLP, VALUES
+from sinks import FORMATS, TextWriter, open_writer
 import config
 
-slangs = {}
-with open('slangs_meaning.csv', 'r') as sf:
-    reader = csv.DictReader(sf)
-    for row in reader:
-        slangs[row['slang']] = row['meaning']
+# The twitter client, the JSON-RPC client and the analyzer package, the
+# cache, the normalizer and the other stages are imported where they are
+# first used, so that runs stopping early (--help, bad arguments) do not
+# pay for them. benchmarks/bench_startup.py keeps track of the cost.
+
+# tweets sent to corenlp in one request
+BATCH_SIZE = 20
+# tweets asked for by default, over as many API pages as it takes
+LIMIT = 200
+
+normalizer = None
+
+
+def get_normalizer():
+    ''' The shared TweetNormalizer, built on first use '''
+    global normalizer
+    if normalizer is None:
+        from normalizer import TweetNormalizer
+        normalizer = TweetNormalizer()
+    return normalizer
 
 
 def data_pre_processing(tweet):
@@ -29,53 +44,17 @@ def data_pre_processing(tweet):
     ex: http://facebook.com = ||U||
     step 6: Replace all the negations with "NOT"
     ex: not, no, never, n't, cannot - NOT
-    '''
-
-    if tweet == ' ':
-        return None
-
-    #replace the slangs
-    tokens = tweet.split(' ')
-    for i in range(len(tokens)):
-        for key in slangs.keys():
-            if key == tokens[i]:
-                tokens[i] = slangs[key]
-
-
-    #replace the emoticons
-    for i in range(len(tokens)):
-        for key in config.EMOTICONS.keys():
-            if key == tokens[i]:
-                tokens[i] = config.EMOTICONS[key]
-
-
-    #replace the links
-    #replace the users
-    #replace the negations
-    for token in range(len(tokens)):
-        if tokens[token].startswith('http') or tokens[token].startswith('www'):
-            tokens[token] = '||U||'
-
-        elif tokens[token].startswith('@'):
-            tokens[token] = '||T||'
-
-        elif tokens[token] in ['not', 'no', 'never', 'n\'t', 'cannot']:
-            tokens[token] = 'NOT'
-
 
-    #remove the stopwords (english only)
-    stop = stopwords.words("english")
-    tokens_ = []
-    for i in tokens:
-        if i not in stop:
-            tokens_.append(i)
-
-    tokens = tokens_
+    All the steps run in a single pass, see normalizer.TweetNormalizer
+    '''
+    return get_normalizer().normalize(tweet)
 
 
-    tokens = [' ' + token + ' ' for token in tokens]
-    tweet = "".join(tokens)
-    return tweet
+def lexicon_pre_processing(tweet):
+    ''' data_pre_processing, keeping the stopwords the lexicon scores by
+    (normalizer.KEPT), for lexicon.LexiconClassifier and bulk.BulkScorer
+    '''
+    return get_normalizer().normalize(tweet, kept=True)
 
 
 def categorize_sentiment(result):
@@ -95,46 +74,229 @@ def categorize_sentiment(result):
         return 'Neutral'
 
 
-def process(tweets, details):
-    ''' Get the overall sentiment of the tweets '''
-
-    overall = 0
-    for tweet in tweets:
+def batches(iterable, size):
+    ''' Split an iterable into lists of at most size items '''
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-        usable_tweet = data_pre_processing(tweet['text'].encode('utf-8'))
-
-        if not usable_tweet:
-            continue
 
+def prefetch(iterable, size):
+    ''' Iterate over iterable from a background thread, keeping up to size
+    items ready, so producing the items overlaps with consuming them.
+    An error in the producer is raised in the consumer.
+    '''
+    queue = Queue.Queue(size)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put((item, None))
+        except Exception as e:
+            queue.put((done, e))
+        else:
+            queue.put((done, None))
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+    while True:
+        item, error = queue.get()
+        if item is done:
+            if error is not None:
+                raise error
+            return
+        yield item
+
+
+def parse(nlp, texts, sentiment_only=False):
+    ''' The sentences corenlp makes of each text, empty where it failed '''
+    if not texts:
+        return []
+    if sentiment_only:
+        return [[{'sentiment': label} for label in labels]
+                for labels in nlp.sentiment_many(texts)]
+    return [results['sentences'] if results else []
+            for results in nlp.parse_many(texts)]
+
+
+def process(tweets, details, nlp=None, batch_size=BATCH_SIZE, sentiment_only=False,
+            writer=None, aggregator=None, query=None, cascade=None, neardup=None):
+    ''' Get the overall sentiment of the tweets
+
+    The tweets go to corenlp batch_size at a time, each batch in a single
+    request over the connection of one shared StanfordNLP client.
+    tweets can be a generator, it is drained on a separate thread so the
+    next tweets are fetched while a batch is being analyzed.
+    With sentiment_only, only the sentiment labels are asked for.
+    The result of each tweet goes to writer (see sinks.py), or with details
+    and no writer, printed as text.
+    Every result also updates aggregator, under query, which can be read
+    while the run goes on. The aggregator is returned.
+    With a lexicon.Cascade, the tweets it is confident about are not sent
+    to corenlp, but for the ones it samples to check itself against it.
+    With a neardup.NearDuplicates, the tweets barely differing from one
+    corenlp already analyzed take its sentiment instead of being parsed,
+    as do those barely differing from one sent earlier in the same batch.
+    '''
+    from sentiment import StanfordNLP, VALUES
+    from analyzer.metrics import METRICS
+    from aggregate import SentimentAggregator
+    if neardup is not None:
+        from neardup import NearDuplicates
+    if nlp is None:
         nlp = StanfordNLP()
-        results = nlp.parse(usable_tweet)
-        result = results['sentences']
-        sentiment = categorize_sentiment(result)
-        value = VALUES[sentiment]
-        overall += value
-
-        if details:
-            print 'Original tweet: ', tweet['text'].encode('utf-8')
-            print 'Post Pre Processed tweet: ', usable_tweet
-            print 'The sentiment of tweet as processed by corenlp: ', sentiment
-            print '--------------------------------------------------'
-
+    own_writer = writer is None and details
+    if own_writer:
+        writer = TextWriter(sys.stdout)
+    if aggregator is None:
+        aggregator = SentimentAggregator()
+
+    for batch in batches(prefetch(tweets, 2 * batch_size), batch_size):
+        usable = []
+        for tweet in batch:
+            with METRICS.timer('pre_processing'):
+                usable_tweet = data_pre_processing(tweet['text'].encode('utf-8'))
+            if usable_tweet:
+                usable.append((tweet, usable_tweet))
+
+        decided = {}
+        to_parse = []
+        fingerprints = {}
+        # the tweets of the batch sent to corenlp, by fingerprint, and the
+        # ones near one of them, which take its sentiment once it is parsed
+        pending = None if neardup is None else NearDuplicates(neardup.distance, len(usable) or 1)
+        twins = {}
+        for n, (tweet, usable_tweet) in enumerate(usable):
+            if neardup is not None:
+                with METRICS.timer('near_duplicates'):
+                    fingerprint = neardup.fingerprint(usable_tweet)
+                    label = twin = None
+                    if fingerprint is not None:
+                        label = neardup.find(fingerprint)
+                        if label is None:
+                            twin = pending.find(fingerprint)
+                if label is not None:
+                    decided[n] = label
+                    continue
+                fingerprints[n] = fingerprint
+                if twin is not None:
+                    twins[n] = twin
+                    continue
+            label = None
+            if cascade is not None:
+                with METRICS.timer('pre_processing'):
+                    lexicon_tweet = lexicon_pre_processing(tweet['text'].encode('utf-8'))
+                label = cascade.first_pass(lexicon_tweet)
+            if label is None:
+                to_parse.append(n)
+                if fingerprints.get(n) is not None:
+                    pending.add(fingerprints[n], n)
+            else:
+                decided[n] = label
+                if cascade.should_sample():
+                    to_parse.append(n)
+
+        parsed = parse(nlp, [usable[n][1] for n in to_parse], sentiment_only)
+        parsed = dict(zip(to_parse, parsed))
+        # the ones near a tweet corenlp failed on are parsed on their own
+        missed = [n for n in sorted(twins) if not parsed.get(twins[n])]
+        for n in missed:
+            del twins[n]
+        parsed.update(zip(missed, parse(nlp, [usable[n][1] for n in missed],
+                                        sentiment_only)))
+
+        sentiments = {}
+        for n, (tweet, usable_tweet) in enumerate(usable):
+            result = parsed.get(n)
+            if n in decided:
+                sentiment = decided[n]
+                if result:
+                    cascade.compare(sentiment, categorize_sentiment(result), VALUES)
+            elif n in twins:
+                sentiment = sentiments[twins[n]]
+                neardup.reused += 1
+            elif not result:
+                # corenlp failed on this one
+                continue
+            else:
+                sentiment = sentiments[n] = categorize_sentiment(result)
+                if fingerprints.get(n) is not None:
+                    neardup.add(fingerprints[n], sentiment)
+            value = VALUES[sentiment]
+            aggregator.add(tweet, sentiment, value, query)
+
+            if writer is not None:
+                writer.write({'id': tweet.get('id'), 'text': tweet['text'],
+                              'normalized': usable_tweet, 'label': sentiment,
+                              'value': value})
+
+    if own_writer:
+        writer.close()
+
+    if cascade is not None:
+        for line in cascade.report():
+            print line
+    if neardup is not None:
+        for line in neardup.report():
+            print line
     print 'The overall sentiment of the recieved tweets is: '
-    if overall > 0:
+    if aggregator.overall.total > 0:
        print 'Positive'
     else:
        print 'Negative'
+    return aggregator
+
+
+def print_summary(snapshot, top=10):
+    ''' Sentiment per time window and of the most used hashtags '''
+    print 'Sentiment per window: '
+    for start in sorted(snapshot['windows']):
+        stats = snapshot['windows'][start]
+        print '  %s  %6d tweets  mean %+.2f' % (
+            time.strftime('%Y-%m-%d %H:%M', time.gmtime(start)), stats['count'], stats['mean'])
+    print 'Sentiment of the top hashtags: '
+    tags = sorted(snapshot['hashtags'].iteritems(), key=lambda item: -item[1]['count'])
+    for tag, stats in tags[:top]:
+        print '  #%-20s %6d tweets  mean %+.2f' % (tag.encode('utf-8'), stats['count'], stats['mean'])
+
+
+def print_metrics(nlp):
+    ''' Time spent per stage, here and in the analyzer '''
+    from analyzer.metrics import METRICS, format_summary
+    print 'Time per stage: '
+    for line in format_summary(METRICS.summary()):
+        print '  ' + line
+    try:
+        server = nlp.server.metrics_summary()
+    except Exception:
+        return
+    print 'Time per stage in the analyzer: '
+    for line in format_summary(server):
+        print '  ' + line
 
 
 class Tweets():
-    ''' To get tweets via search or user tweets '''
+    ''' To get tweets via search or user tweets
+
+    domain and secure point the client at another endpoint, a local fake
+    of the Twitter API for instance.
+    '''
 
-    def __init__(self):
+    def __init__(self, domain='api.twitter.com', secure=True):
+        from twitter import Twitter, OAuth
         self.t = Twitter(auth=OAuth( \
                     config.TOKEN,
                     config.TOKEN_KEY,
                     config.CON_SECRET,
-                    config.CON_SECRET_KEY)
+                    config.CON_SECRET_KEY),
+                    domain=domain, secure=secure
         )
 
     def search(self, query):
@@ -148,6 +310,38 @@ class Tweets():
         tweets = self.t.statuses.user_timeline(screen_name=user)
         return tweets
 
+    def _pages(self, fetch, limit, since_id, count):
+        ''' Yield the tweets of fetch page by page, newest first, walking
+        back with max_id until limit tweets, an empty page or since_id
+        '''
+        max_id = None
+        fetched = 0
+        while limit is None or fetched < limit:
+            params = {'count': count if limit is None else min(count, limit - fetched)}
+            if max_id is not None:
+                params['max_id'] = max_id
+            if since_id is not None:
+                params['since_id'] = since_id
+            page = fetch(**params)
+            if not page:
+                return
+            for tweet in page:
+                yield tweet
+                fetched += 1
+                if fetched == limit:
+                    return
+            max_id = min(tweet['id'] for tweet in page) - 1
+
+    def search_all(self, query, limit=LIMIT, since_id=None, count=100):
+        ''' Generator over the tweets matching query, across pages '''
+        return self._pages(lambda **params: self.t.search.tweets(q=query, **params)['statuses'],
+                           limit, since_id, count)
+
+    def user_all(self, user, limit=LIMIT, since_id=None, count=200):
+        ''' Generator over the tweets of a particular user, across pages '''
+        return self._pages(lambda **params: self.t.statuses.user_timeline(screen_name=user, **params),
+                           limit, since_id, count)
+
 
 def main():
     parser = ArgumentParser(description='Sentiment Analysis of twitter reviews')
@@ -157,29 +351,143 @@ def main():
             particular user')
     parser.add_argument('-d', '--details', default=False, help='If you want to \
             see the details of each step for each tweet')
+    parser.add_argument('--server', default='localhost:8080', help='host:port \
+            of the analyzer/corenlp.py server')
+    parser.add_argument('-c', '--cache', help='SQLite file keeping the \
+            sentiment of tweets already analyzed across runs')
+    parser.add_argument('--cache-size', type=int, default=10000, help='Results \
+            kept in memory by the cache')
+    parser.add_argument('-P', '--properties', default='default.properties',
+            help='Properties file the analyzer runs with, part of the cache key')
+    parser.add_argument('--sentiment-only', action='store_true', help='Only \
+            fetch the sentiment labels, best with the analyzer running \
+            -P sentiment.properties')
+    parser.add_argument('-o', '--output', help='File to write the result of \
+            each tweet to, - for stdout')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='jsonl',
+            help='Format of --output')
+    parser.add_argument('--flush-interval', type=float, default=1.0,
+            help='Most seconds results wait before being written to --output')
+    parser.add_argument('-w', '--window', type=int, default=3600, help='Seconds \
+            of tweets aggregated together in the summary')
+    parser.add_argument('--summary', action='store_true', help='Print the \
+            sentiment per window and per hashtag at the end')
+    parser.add_argument('-m', '--metrics', action='store_true', help='Time \
+            each stage and print a summary at the end, with the analyzer\'s \
+            own if it runs with --metrics')
+    parser.add_argument('-L', '--lexicon', type=float, metavar='THRESHOLD',
+            help='Let the lexicon answer for the tweets it classifies with at \
+            least this confidence (0 to 1, 0.6 is a good start) instead of corenlp')
+    parser.add_argument('--agreement-sample', type=float, default=0.0,
+            help='Fraction of the tweets answered by the lexicon also sent to \
+            corenlp, to report how often they agree')
+    parser.add_argument('-N', '--near-duplicates', type=int, metavar='DISTANCE',
+            help='Reuse the sentiment of a tweet already analyzed for the \
+            ones whose fingerprint is at most this many bits away from its \
+            (0 to 63, 3 is a good start) instead of parsing them again')
+    parser.add_argument('--near-duplicates-capacity', type=int, default=1000000,
+            help='Most tweets remembered for --near-duplicates, the oldest \
+            forgotten first')
+    parser.add_argument('--bulk', action='store_true', help='Score the tweets \
+            by the lexicon alone, a large batch at a time with NumPy, for \
+            backfills over big archives (no corenlp needed)')
+    parser.add_argument('-i', '--input', help='Analyze the tweets of an \
+            archive, one JSON tweet per line, plain or gzip compressed')
+    parser.add_argument('-l', '--limit', type=int, help='Most tweets to \
+            analyze, fetched over as many pages as needed (default %d), or \
+            lines of the archive to read (default all)' % LIMIT)
+    parser.add_argument('--offset', type=int, default=0, help='Lines of the \
+            archive to skip, without decoding them, before analyzing')
+    parser.add_argument('--since-id', type=int, help='Only fetch tweets \
+            newer than this id')
 
     args = parser.parse_args()
-    if not any([args.search or args.user]):
-        print 'Either search or get tweets of a user'
-        print 'Use either: --user vivekanand1101 or --search \'#Amazon\''
+    if args.near_duplicates is not None and not 0 <= args.near_duplicates <= 63:
+        parser.error('--near-duplicates must be between 0 and 63')
+    if args.near_duplicates_capacity < 1:
+        parser.error('--near-duplicates-capacity must be at least 1')
+    if not any([args.search or args.user or args.input]):
+        print 'Either search, get tweets of a user or read them from an archive'
+        print 'Use either: --user vivekanand1101, --search \'#Amazon\' ' \
+            'or --input tweets.jsonl.gz'
         return
 
-    if args.search and args.user:
-        print 'You can not use both --user and --search at the same time -_- '
+    if len(filter(None, [args.search, args.user, args.input])) > 1:
+        print 'You can only use one of --user, --search and --input at a time -_- '
         return
 
+    limit = LIMIT if args.limit is None else args.limit
     if args.search:
         tweet = Tweets()
-        tweets = tweet.search(args.search)['statuses']
+        tweets = tweet.search_all(args.search, limit, args.since_id)
 
     if args.user:
         tweet = Tweets()
-        tweets = tweet.user(args.user)
+        tweets = tweet.user_all(args.user, limit, args.since_id)
+
+    if args.input:
+        from archive import read_tweets
+        tweets = read_tweets(args.input, args.offset, args.limit)
 
-    if not tweets:
+    first = next(tweets, None)
+    if first is None:
         print 'Couldn\'t fetch any tweets, try again'
         return
-    process(tweets, args.details)
+    tweets = itertools.chain([first], tweets)
+
+    cache = None
+    if args.cache:
+        from analyzer.cache import ResultCache, properties_digest
+        cache = ResultCache(args.cache_size, args.cache, properties_digest(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'analyzer', args.properties)))
+    writer = None
+    if args.output:
+        writer = open_writer(args.output, args.format,
+                             flush_interval=args.flush_interval)
+    if args.bulk:
+        import bulk
+        try:
+            overall = bulk.process(tweets, get_normalizer(), writer=writer)
+        finally:
+            if writer is not None:
+                writer.close()
+        # after the records, when they go to stdout too
+        for line in bulk.report(overall):
+            print line
+        return
+    from sentiment import StanfordNLP
+    from analyzer.metrics import METRICS
+    from aggregate import SentimentAggregator
+    aggregator = SentimentAggregator(args.window)
+    METRICS.enabled = args.metrics
+    host, port = args.server.rsplit(':', 1)
+    nlp = StanfordNLP(int(port), host, cache=cache)
+    cascade = None
+    if args.lexicon is not None:
+        from lexicon import Cascade
+        cascade = Cascade(args.lexicon, args.agreement_sample)
+    neardup = None
+    if args.near_duplicates is not None:
+        from neardup import NearDuplicates
+        neardup = NearDuplicates(args.near_duplicates, args.near_duplicates_capacity)
+    try:
+        process(tweets, args.details, nlp,
+                sentiment_only=args.sentiment_only, writer=writer,
+                aggregator=aggregator,
+                query=args.search or (args.user and '@' + args.user) or args.input,
+                cascade=cascade, neardup=neardup)
+    finally:
+        if writer is not None:
+            writer.close()
+    if args.summary:
+        print_summary(aggregator.snapshot())
+    if args.metrics:
+        print_metrics(nlp)
+    if cache is not None:
+        print 'Cache: %(hits)d hits, %(disk_hits)d from disk, %(misses)d misses, ' \
+            '%(evictions)d evictions' % cache.stats()
+        cache.close()
 
 
 if __name__ == '__main__':
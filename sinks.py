@@ -0,0 +1,136 @@
+'''
+Writers for the per-tweet results of script.process, buffered and flushed
+in batches from a background thread
+'''
+import csv
+import sys
+import json
+import time
+import Queue
+import threading
+
+FIELDS = ('id', 'text', 'normalized', 'label', 'value')
+FORMATS = ('jsonl', 'csv', 'text')
+
+
+class ResultWriter(object):
+    ''' Collects result records and writes them out off the caller's thread.
+
+    write() hands a record to a bounded queue, only blocking when
+    buffer_size records are already waiting. A background thread writes
+    them in batches, when buffer_size records have piled up or
+    flush_interval seconds have passed since the last flush, whichever
+    comes first. Subclasses say how a batch is written.
+    '''
+
+    def __init__(self, stream, buffer_size=1000, flush_interval=1.0, owned=False):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.owned = owned
+        self.written = 0
+        self.error = None
+        self.queue = Queue.Queue(buffer_size)
+        self.done = object()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, record):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(record)
+
+    def close(self):
+        ''' Write out what is left and wait for it '''
+        self.queue.put(self.done)
+        self.thread.join()
+        if self.owned:
+            self.stream.close()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        batch = []
+        deadline = time.time() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0, deadline - time.time()))
+            except Queue.Empty:
+                record = None
+            finished = record is self.done
+            if record is not None and not finished:
+                batch.append(record)
+            if finished or len(batch) >= self.buffer_size or time.time() >= deadline:
+                if batch and self.error is None:
+                    try:
+                        self._write_batch(batch)
+                        self.stream.flush()
+                        self.written += len(batch)
+                    except Exception as e:
+                        self.error = e
+                batch = []
+                deadline = time.time() + self.flush_interval
+            if finished:
+                return
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+
+class JSONLWriter(ResultWriter):
+    ''' One JSON object per line '''
+
+    def _write_batch(self, records):
+        self.stream.write(''.join(json.dumps(record) + '\n' for record in records))
+
+
+class CSVWriter(ResultWriter):
+    ''' Comma separated values, headed by FIELDS '''
+
+    def __init__(self, *args, **kwargs):
+        self.header = True
+        super(CSVWriter, self).__init__(*args, **kwargs)
+
+    def _write_batch(self, records):
+        writer = csv.writer(self.stream)
+        if self.header:
+            writer.writerow(FIELDS)
+            self.header = False
+        writer.writerows([[encode(record[field]) for field in FIELDS]
+                          for record in records])
+
+
+class TextWriter(ResultWriter):
+    ''' The human readable details script.py has always printed '''
+
+    def _write_batch(self, records):
+        lines = []
+        for record in records:
+            lines.append('Original tweet:  %s' % encode(record['text']))
+            lines.append('Post Pre Processed tweet:  %s' % encode(record['normalized']))
+            lines.append('The sentiment of tweet as processed by corenlp:  %s' % record['label'])
+            lines.append('--------------------------------------------------')
+        self.stream.write('\n'.join(lines) + '\n')
+
+
+WRITERS = {'jsonl': JSONLWriter, 'csv': CSVWriter, 'text': TextWriter}
+
+
+def encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if value is None:
+        return ''
+    return value
+
+
+def open_writer(path=None, format='jsonl', buffer_size=1000, flush_interval=1.0):
+    ''' A writer of the given format to the file at path, or to stdout when
+    path is None or -
+    '''
+    if format not in WRITERS:
+        raise ValueError('Unknown format %r, use one of %s' % (format, ', '.join(FORMATS)))
+    if path is None or path == '-':
+        return WRITERS[format](sys.stdout, buffer_size, flush_interval)
+    return WRITERS[format](open(path, 'wb'), buffer_size, flush_interval, owned=True)
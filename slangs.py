@@ -1,6 +1,25 @@
+'''
+Scrapes the noslang.com dictionary into slangs_meaning.csv and compiles it
+into the table the analysis loads, see normalizer.SlangTable, along with a
+snapshot of the normalizer built from it
+
+    python slangs.py            refresh from the dictionary, then build
+    python slangs.py --build    only build, after editing the CSV by hand
+
+The pages are fetched a few at a time over kept-alive connections, with
+the ETag and Last-Modified date of the last refresh so that unchanged ones
+are not sent again. Only what changed on the pages is merged into the CSV:
+slangs added by hand stay.
+'''
+import os
 import csv
-import urllib2
-from lxml import etree
+import json
+import Queue
+import threading
+from argparse import ArgumentParser
+
+from normalizer import HERE, SLANGS_CSV, SLANGS_TABLE, NORMALIZER_SNAPSHOT, SlangTable, \
+    TweetNormalizer, read_slangs_csv, write_slang_table
 
 slugs = ['1', 'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm',
         'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z']
@@ -9,6 +28,11 @@ slugs = ['1', 'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm',
 
 base_url = 'http://www.noslang.com/dictionary/'
 
+# validators and slangs of every page as of the last refresh
+STATE = os.path.join(HERE, 'slangs_state.json')
+# pages fetched at the same time, over as many connections
+WORKERS = 8
+
 
 hdr = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
@@ -18,27 +42,211 @@ hdr = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML,
        'Connection': 'keep-alive'
 }
 
-url_list = []
-for slug in slugs:
-    url_list.append(base_url + slug)
 
-for url in url_list:
-    request = urllib2.Request(url, headers=hdr)
-    r = urllib2.urlopen(request)
-    htmlparser = etree.HTMLParser()
-    tree = etree.parse(r, htmlparser)
+def parse_page(content):
+    ''' The (slang, meaning) pairs of one dictionary page '''
+    from lxml import etree
+    tree = etree.fromstring(content, etree.HTMLParser())
     slang = tree.xpath('//a/@name')
     slang = slang[1:]
     meaning = tree.xpath('//abbr/@title')
-    #slang_meaning = dict(zip(slang, meaning))
-    slang_meaning = []
-    for i in range(len(slang)):
-        d = {'slang': slang[i], 'meaning': meaning[i]}
-        slang_meaning.append(d)
+    return zip([s.encode('utf-8') for s in slang],
+               [m.encode('utf-8') for m in meaning])
+
+
+class Refresher(object):
+    ''' Fetches the dictionary pages that changed since the last refresh.
+
+    The workers share one requests.Session, whose pool keeps a connection
+    open for each of them. The ETag and Last-Modified date of every page
+    go back in If-None-Match and If-Modified-Since, a page that did not
+    change is answered with 304 Not Modified and no body.
+    '''
+
+    def __init__(self, base_url=base_url, workers=WORKERS, state=STATE, timeout=30.0):
+        import requests
+        self.base_url = base_url
+        self.workers = workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(hdr)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.state_path = state
+        self.pages = load_state(state)
+
+    def fetch(self, slug, conditional=True):
+        ''' The page as {'etag', 'last_modified', 'slangs'}, None when it
+        did not change
+        '''
+        headers = {}
+        known = self.pages.get(slug)
+        if conditional and known:
+            if known.get('etag'):
+                headers['If-None-Match'] = known['etag']
+            if known.get('last_modified'):
+                headers['If-Modified-Since'] = known['last_modified']
+        response = self.session.get(self.base_url + slug, headers=headers,
+                                    timeout=self.timeout)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return {'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'slangs': parse_page(response.content)}
+
+    def fetch_all(self, slugs=slugs, conditional=True):
+        ''' Fetch the pages, workers at a time. Returns the pages that
+        changed by slug, and the errors of those that could not be fetched
+        '''
+        todo = Queue.Queue()
+        for slug in slugs:
+            todo.put(slug)
+        changed = {}
+        errors = {}
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                try:
+                    slug = todo.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    page = self.fetch(slug, conditional)
+                except Exception as e:
+                    with lock:
+                        errors[slug] = e
+                    continue
+                if page is not None:
+                    with lock:
+                        changed[slug] = page
+
+        threads = [threading.Thread(target=work) for _ in xrange(min(self.workers, len(slugs)))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+        return changed, errors
+
+    def refresh(self, path=SLANGS_CSV, table=SLANGS_TABLE, snapshot=NORMALIZER_SNAPSHOT,
+                slugs=slugs, conditional=True):
+        ''' Fetch the pages that changed, merge them into the CSV and build
+        it if anything changed. Returns the counts of slangs added, changed
+        and removed, and the errors of the pages that could not be fetched
+        '''
+        changed, errors = self.fetch_all(slugs, conditional)
+        slangs = read_slangs_csv(path)
+        counts = merge(slangs, self.pages, changed)
+        if any(counts):
+            write_csv(slangs, path)
+            build(path, table, snapshot)
+        self.pages.update(changed)
+        if changed:
+            save_state(self.pages, self.state_path)
+        return counts, len(changed), errors
+
+    def close(self):
+        self.session.close()
+
 
-    with open('slangs_meaning.csv', 'a') as sm:
+def merge(slangs, pages, changed):
+    ''' Apply to slangs what changed between pages and the changed pages.
+    A slang gone from its page is only removed if it still has the page's
+    meaning. Returns the counts of slangs added, changed and removed.
+    '''
+    added = updated = removed = 0
+    for slug, page in changed.iteritems():
+        old = dict(pages.get(slug, {}).get('slangs', ()))
+        new = dict(page['slangs'])
+        for slang, meaning in old.iteritems():
+            if slang not in new and slangs.get(slang) == meaning:
+                del slangs[slang]
+                removed += 1
+        for slang, meaning in new.iteritems():
+            if slang not in slangs:
+                added += 1
+            elif slangs[slang] != meaning:
+                updated += 1
+            else:
+                continue
+            slangs[slang] = meaning
+    return added, updated, removed
+
+
+def load_state(path=STATE):
+    ''' The pages as of the last refresh, by slug '''
+    try:
+        with open(path) as f:
+            pages = json.load(f)
+    except IOError:
+        return {}
+    for page in pages.itervalues():
+        page['slangs'] = [(slang.encode('utf-8'), meaning.encode('utf-8'))
+                          for slang, meaning in page['slangs']]
+    return pages
+
+
+def save_state(pages, path=STATE):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(pages, f, sort_keys=True)
+    os.rename(tmp, path)
+
+
+def write_csv(slangs, path=SLANGS_CSV):
+    ''' Rewrite the CSV with a single header and one row per slang,
+    atomically
+    '''
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as sm:
         field_names = ['slang', 'meaning']
         writer = csv.DictWriter(sm, fieldnames=field_names)
         writer.writeheader()
-        for j in slang_meaning:
-            writer.writerow(j)
+        for slang in sorted(slangs):
+            writer.writerow({'slang': slang, 'meaning': slangs[slang]})
+    os.rename(tmp, path)
+
+
+def build(path=SLANGS_CSV, table=SLANGS_TABLE, snapshot=NORMALIZER_SNAPSHOT):
+    ''' Dedupe the CSV, compile it and snapshot the normalizer built from
+    it, returns the number of slangs
+    '''
+    slangs = read_slangs_csv(path)
+    write_csv(slangs, path)
+    write_slang_table(slangs, table)
+    TweetNormalizer(SlangTable(table), snapshot=None).save(snapshot)
+    return len(slangs)
+
+
+def main():
+    parser = ArgumentParser(description='Scrape and compile the slang table')
+    parser.add_argument('--build', action='store_true', help='Only compile \
+            the CSV, without scraping')
+    parser.add_argument('--base-url', default=base_url, help='Where the \
+            dictionary pages are, each at the url followed by its slug')
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS,
+            help='Pages fetched at the same time')
+    parser.add_argument('--full', action='store_true', help='Fetch every \
+            page, changed or not')
+    args = parser.parse_args()
+
+    if args.build:
+        print '%d slangs compiled into %s' % (build(), SLANGS_TABLE)
+        return
+
+    refresher = Refresher(args.base_url, args.workers)
+    try:
+        (added, updated, removed), changed, errors = refresher.refresh(conditional=not args.full)
+    finally:
+        refresher.close()
+    print '%d of %d pages changed, %d slangs added, %d changed, %d removed' % (
+        changed, len(slugs), added, updated, removed)
+    for slug in sorted(errors):
+        print 'Could not fetch %s%s: %s' % (args.base_url, slug, errors[slug])
+
+
+if __name__ == '__main__':
+    main()
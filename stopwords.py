@@ -0,0 +1,55 @@
+'''
+Snapshot of the nltk english stopword list, so that loading it does not
+import nltk, most of a second. python stopwords.py writes it again from
+nltk, after an update of its corpus.
+'''
+import os
+
+ENGLISH = frozenset([
+    'a', 'about', 'above', 'after', 'again', 'against', 'ain', 'all', 'am',
+    'an', 'and', 'any', 'are', 'aren', 'as', 'at', 'be', 'because', 'been',
+    'before', 'being', 'below', 'between', 'both', 'but', 'by', 'can',
+    'couldn', 'd', 'did', 'didn', 'do', 'does', 'doesn', 'doing', 'don',
+    'down', 'during', 'each', 'few', 'for', 'from', 'further', 'had', 'hadn',
+    'has', 'hasn', 'have', 'haven', 'having', 'he', 'her', 'here', 'hers',
+    'herself', 'him', 'himself', 'his', 'how', 'i', 'if', 'in', 'into', 'is',
+    'isn', 'it', 'its', 'itself', 'just', 'll', 'm', 'ma', 'me', 'mightn',
+    'more', 'most', 'mustn', 'my', 'myself', 'needn', 'no', 'nor', 'not',
+    'now', 'o', 'of', 'off', 'on', 'once', 'only', 'or', 'other', 'our',
+    'ours', 'ourselves', 'out', 'over', 'own', 're', 's', 'same', 'shan',
+    'she', 'should', 'shouldn', 'so', 'some', 'such', 't', 'than', 'that',
+    'the', 'their', 'theirs', 'them', 'themselves', 'then', 'there', 'these',
+    'they', 'this', 'those', 'through', 'to', 'too', 'under', 'until', 'up',
+    've', 'very', 'was', 'wasn', 'we', 'were', 'weren', 'what', 'when',
+    'where', 'which', 'while', 'who', 'whom', 'why', 'will', 'with', 'won',
+    'wouldn', 'y', 'you', 'your', 'yours', 'yourself', 'yourselves',
+])
+
+
+def snapshot(language='english'):
+    ''' The source of this module for the current nltk stopword list '''
+    from nltk.corpus import stopwords
+    words = sorted(set(word.encode('ascii') for word in stopwords.words(language)))
+    lines = []
+    line = '   '
+    for word in words:
+        item = ' %r,' % word
+        if len(line) + len(item) > 79:
+            lines.append(line)
+            line = '   '
+        line += item
+    lines.append(line)
+    with open(__file__.rstrip('c')) as f:
+        source = f.read()
+    head, rest = source.split('ENGLISH = frozenset([\n', 1)
+    tail = rest.split('\n])\n', 1)[1]
+    return '%sENGLISH = frozenset([\n%s\n])\n%s' % (head, '\n'.join(lines), tail)
+
+
+if __name__ == '__main__':
+    source = snapshot()
+    path = os.path.abspath(__file__.rstrip('c'))
+    with open(path + '.tmp', 'w') as f:
+        f.write(source)
+    os.rename(path + '.tmp', path)
+    print 'Wrote %s' % path
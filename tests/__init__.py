@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the stand-ins the tests run against live with the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'benchmarks'))
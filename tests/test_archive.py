@@ -0,0 +1,60 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+import archive
+from archive import read_tweets
+
+LINES = [json.dumps({'id': n, 'text': 'tweet %d' % n}) if n % 5 else
+         ['', 'not json', json.dumps({'delete': {'id': n}})][n % 3]
+         for n in xrange(100)]
+
+
+class ReadTweetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.plain = os.path.join(self.dir, 'tweets.jsonl')
+        self.gzip = os.path.join(self.dir, 'tweets.jsonl.gz')
+        with open(self.plain, 'wb') as f:
+            f.write('\n'.join(LINES) + '\n')
+        with gzip.open(self.gzip, 'wb') as f:
+            f.write('\n'.join(LINES) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def ids(self, *args):
+        return [tweet['id'] for tweet in read_tweets(*args)]
+
+    def test_everything(self):
+        for path in (self.plain, self.gzip):
+            self.assertEqual(self.ids(path), [n for n in xrange(100) if n % 5])
+
+    def test_slices_cover_the_archive_once(self):
+        for path in (self.plain, self.gzip):
+            ids = []
+            for offset in xrange(0, 100, 30):
+                ids.extend(self.ids(path, offset, 30))
+            self.assertEqual(ids, self.ids(path))
+
+    def test_offset_counts_lines(self):
+        self.assertEqual(self.ids(self.plain, 10, 5), [11, 12, 13, 14])
+
+    def test_skipped_lines_are_not_decoded(self):
+        decoded = []
+        loads = archive.json.loads
+
+        def counting(line):
+            decoded.append(line)
+            return loads(line)
+        archive.json.loads = counting
+        try:
+            self.assertEqual(self.ids(self.plain, 90), [91, 92, 93, 94, 96, 97, 98, 99])
+        finally:
+            archive.json.loads = loads
+        # the ten lines from 90, but for the blank one
+        self.assertEqual(len(decoded), 9)
@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+import corpus
+import bulk
+from normalizer import TweetNormalizer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(HERE), 'script.py')
+SLANGS = {'lol': 'laughing out loud', 'gr8': 'great', 'fo sho': 'for sure',
+          'cancer stick': 'cigarette', 'u': 'you'}
+EMOTICONS = {':)': 'smile', ':(': 'sad', ':D': 'laugh', ': )': 'smile'}
+STOP = frozenset(['the', 'a', 'is', 'very'])
+TWEETS = ['lol da movie is very gr8:):)', 'fo sho u', 'fo  sho', ':)cancer sticks',
+          'a: ) b', 'not very good', ' ', '', 'a  b', 'fo sho:)lol']
+
+
+class NormalizeManyTest(unittest.TestCase):
+
+    def test_same_as_one_at_a_time(self):
+        normalizer = TweetNormalizer(SLANGS, EMOTICONS, STOP)
+        tweets = TWEETS + [tweet.encode('utf-8') for tweet in corpus.tweets(500)]
+        for kept in (False, True):
+            expected = [normalizer.normalize(tweet, kept) for tweet in tweets]
+            self.assertEqual(normalizer.normalize_many(tweets, kept), expected)
+            # again, from the tokens remembered
+            self.assertEqual(normalizer.normalize_many(tweets, kept), expected)
+
+
+class BulkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_verdict_follows_the_records(self):
+        path = os.path.join(self.tmp, 'tweets.jsonl')
+        with open(path, 'w') as f:
+            for i, text in enumerate(['so good', 'very good', 'not bad']):
+                f.write(json.dumps({'id': i, 'text': text}) + '\n')
+        output = subprocess.check_output([sys.executable, SCRIPT, '--input', path,
+                                          '--bulk', '--output', '-'])
+        lines = output.splitlines()
+        self.assertEqual(lines[-2:], bulk.report(1))
+        self.assertEqual([json.loads(line)['id'] for line in lines[:-2]], [0, 1, 2])
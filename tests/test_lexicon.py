@@ -0,0 +1,31 @@
+import unittest
+
+from lexicon import LexiconClassifier
+from normalizer import TweetNormalizer
+
+
+class IntensifierTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.normalizer = TweetNormalizer(snapshot=None)
+        cls.classifier = LexiconClassifier()
+
+    def score(self, tweet):
+        return self.classifier.score(self.normalizer.normalize(tweet, kept=True))[0]
+
+    def test_intensifier_survives_pre_processing(self):
+        tokens = self.normalizer.normalize('the movie was very good', kept=True).split()
+        self.assertIn('very', tokens)
+        self.assertNotIn('the', tokens)
+
+    def test_corenlp_text_unchanged(self):
+        self.assertEqual(self.normalizer.normalize('the movie was very good'), ' movie  good ')
+
+    def test_intensifier_doubles(self):
+        self.assertEqual(self.score('the movie was very good'),
+                         2 * self.score('the movie was good'))
+
+    def test_negation(self):
+        self.assertEqual(self.score('the movie was not good'),
+                         -self.score('the movie was good') / 2.0)
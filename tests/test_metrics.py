@@ -0,0 +1,48 @@
+import sys
+import time
+import unittest
+
+import fake_corenlp
+from analyzer.corenlp import StanfordCoreNLP
+from analyzer.metrics import METRICS
+
+FAKE_CORENLP = '%s %s --latency 0.05' % (sys.executable, fake_corenlp.__file__.replace('.pyc', '.py'))
+
+
+class StageTimersTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corenlp = StanfordCoreNLP(command=FAKE_CORENLP)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.corenlp.close()
+
+    def setUp(self):
+        METRICS.enabled = True
+        METRICS.histograms = {}
+        METRICS.counters = {}
+
+    def tearDown(self):
+        METRICS.enabled = False
+
+    def stages(self):
+        return METRICS.summary()['stages']
+
+    def test_shell_and_parsing_do_not_overlap(self):
+        start = time.time()
+        self.corenlp.raw_parse('the movie was not great i love this phone ' * 20)
+        elapsed = time.time() - start
+        stages = self.stages()
+        self.assertGreaterEqual(stages['shell']['sum'], 0.05)
+        self.assertLessEqual(stages['shell']['sum'] + stages['parse_results']['sum'], elapsed)
+
+    def test_batch(self):
+        start = time.time()
+        self.corenlp.raw_parse_batch(['the movie was great', 'so bad'])
+        elapsed = time.time() - start
+        stages = self.stages()
+        self.assertEqual(stages['shell_batch']['count'], 1)
+        self.assertGreaterEqual(stages['shell_batch']['sum'], 0.1)
+        self.assertLessEqual(stages['shell_batch']['sum'] + stages['parse_results']['sum'], elapsed)
@@ -0,0 +1,104 @@
+import os
+import sys
+import StringIO
+import subprocess
+import unittest
+
+import script
+from neardup import NearDuplicates
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'script.py')
+
+
+class FakeNLP(object):
+    ''' Calls StanfordNLP.sentiment_many, every tweet Positive '''
+
+    def __init__(self, failing=()):
+        self.sent = []
+        self.failing = set(failing)
+
+    def sentiment_many(self, texts):
+        self.sent.append(list(texts))
+        return [[] if text in self.failing else ['Positive'] for text in texts]
+
+
+class Collect(object):
+
+    def __init__(self):
+        self.results = []
+
+    def write(self, result):
+        self.results.append(result)
+
+
+class ArgumentsTest(unittest.TestCase):
+
+    def test_index(self):
+        self.assertRaises(ValueError, NearDuplicates, 64)
+        self.assertRaises(ValueError, NearDuplicates, -1)
+        self.assertRaises(ValueError, NearDuplicates, 3, 0)
+        index = NearDuplicates(63, 1)
+        index.add(1, 'Positive')
+        index.add(2, 'Negative')
+        self.assertEqual((len(index), index.find(0)), (1, 'Negative'))
+
+    def error(self, *args):
+        process = subprocess.Popen([sys.executable, SCRIPT, '--input', os.devnull] + list(args),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        return process.returncode, err.strip().splitlines()[-1]
+
+    def test_command_line(self):
+        self.assertEqual(self.error('-N', '64'),
+                         (2, 'script.py: error: --near-duplicates must be between 0 and 63'))
+        self.assertEqual(self.error('-N', '3', '--near-duplicates-capacity', '0'),
+                         (2, 'script.py: error: --near-duplicates-capacity must be at least 1'))
+
+
+class BatchTest(unittest.TestCase):
+
+    def process(self, texts, batch_size, failing=()):
+        nlp = FakeNLP(failing)
+        self.neardup = NearDuplicates(3, 100)
+        writer = Collect()
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            script.process(iter([{'id': n, 'text': text} for n, text in enumerate(texts)]),
+                           False, nlp, batch_size, sentiment_only=True, writer=writer,
+                           neardup=self.neardup)
+        finally:
+            sys.stdout = stdout
+        return nlp.sent, writer.results
+
+    def test_near_duplicates_in_one_batch(self):
+        texts = ['what a great movie, loved every minute of it',
+                 'what a great movie, loved every minute of it http://t.co/1',
+                 'the service at this place was slow and rude',
+                 '@someone what a great movie, loved every minute of it #films']
+        sent, results = self.process(texts, batch_size=10)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(len(sent[0]), 2)
+        self.assertEqual([result['id'] for result in results], [0, 1, 2, 3])
+        self.assertEqual(set(result['label'] for result in results), set(['Positive']))
+        self.assertEqual(self.neardup.reused, 2)
+
+    def test_near_a_failed_parse(self):
+        texts = ['what a great movie, loved every minute of it',
+                 'what a great movie, loved every minute of it http://t.co/1',
+                 'the service at this place was slow and rude']
+        failing = [script.data_pre_processing(texts[0])]
+        sent, results = self.process(texts, batch_size=10, failing=failing)
+        # parsed on its own, once the one it is near failed
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sent[1], [script.data_pre_processing(texts[1])])
+        self.assertEqual([result['id'] for result in results], [1, 2])
+        self.assertEqual(self.neardup.reused, 0)
+
+    def test_near_duplicates_in_later_batches(self):
+        texts = ['what a great movie, loved every minute of it',
+                 'the service at this place was slow and rude',
+                 'what a great movie, loved every minute of it http://t.co/1']
+        sent, results = self.process(texts, batch_size=2)
+        self.assertEqual([len(texts) for texts in sent], [2])
+        self.assertEqual(len(results), 3)
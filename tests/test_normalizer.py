@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import corpus
+from normalizer import SlangTable, TweetNormalizer, write_slang_table
+from phrases import MappedTrie
+
+SLANGS = {'lol': 'laughing out loud', 'gr8': 'great', 'fo sho': 'for sure',
+          'ayte': 'alright', 'alright': 'all right', 'da': 'the', 'u': 'you'}
+EMOTICONS = {':)': 'smile', ':(': 'sad', ':D': 'laugh', 'C:': 'smile'}
+STOP = frozenset(['the', 'a', 'is', 'very'])
+TWEETS = ['lol da movie is gr8:):)', 'fo sho u ayte', 'ABC: :Do great :D',
+          'the very @someone http://t.co/x not good', ' ', '', 'fo sho:)lol']
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.table = os.path.join(self.tmp, 'slangs.table')
+        self.snapshot = os.path.join(self.tmp, 'slangs.normalizer')
+        write_slang_table(SLANGS, self.table)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_mapped_snapshot_normalizes_the_same(self):
+        built = TweetNormalizer(SlangTable(self.table), EMOTICONS, STOP, snapshot=None)
+        built.save(self.snapshot)
+        mapped = TweetNormalizer(SlangTable(self.table), EMOTICONS, STOP, snapshot=self.snapshot)
+        self.assertIsInstance(mapped.lexicon, SlangTable)
+        self.assertIsInstance(mapped.matcher.trie, MappedTrie)
+        plain = TweetNormalizer(SLANGS, EMOTICONS, STOP)
+        for tweet in TWEETS + corpus.tweets(300):
+            self.assertEqual(mapped.normalize(tweet), plain.normalize(tweet))
+            # again, from the rewrites remembered
+            self.assertEqual(mapped.normalize(tweet), plain.normalize(tweet))
+
+    def test_snapshot_of_other_stopwords_is_not_used(self):
+        TweetNormalizer(SlangTable(self.table), EMOTICONS, STOP, snapshot=None).save(self.snapshot)
+        stop = STOP | set(['you'])
+        other = TweetNormalizer(SlangTable(self.table), EMOTICONS, stop, snapshot=self.snapshot)
+        self.assertIsInstance(other.lexicon, dict)
+        self.assertEqual(other.normalize('u lol'), ' laughing out loud ')
@@ -0,0 +1,68 @@
+import threading
+import unittest
+
+from fake_twitter import FakeTwitter, SEARCH, USER_TIMELINE
+from script import Tweets, prefetch
+
+
+class PagingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTwitter(('127.0.0.1', 0), tweets=1000)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.tweets = Tweets(domain=self.server.domain, secure=False)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def ids(self, tweets):
+        return [tweet['id'] for tweet in tweets]
+
+    def test_max_id_walks_back(self):
+        ids = self.ids(self.tweets.search_all('q', limit=250, count=100))
+        self.assertEqual(ids, range(1000, 750, -1))
+        params = [params for path, params in self.server.requests]
+        self.assertEqual([path for path, _ in self.server.requests], [SEARCH] * 3)
+        self.assertNotIn('max_id', params[0])
+        self.assertEqual(params[1]['max_id'], '900')
+        self.assertEqual(params[2]['max_id'], '800')
+
+    def test_limit_cuts_off(self):
+        ids = self.ids(self.tweets.user_all('u', limit=130, count=50))
+        self.assertEqual(len(ids), 130)
+        # the last page only asks for what is left
+        self.assertEqual([params['count'] for _, params in self.server.requests],
+                         ['50', '50', '30'])
+
+    def test_since_id_stops(self):
+        ids = self.ids(self.tweets.user_all('u', limit=None, since_id=900, count=40))
+        self.assertEqual(ids, range(1000, 900, -1))
+        for path, params in self.server.requests:
+            self.assertEqual(path, USER_TIMELINE)
+            self.assertEqual(params['since_id'], '900')
+
+    def test_no_limit_reads_everything(self):
+        ids = self.ids(self.tweets.search_all('q', limit=None, count=100))
+        self.assertEqual(ids, range(1000, 0, -1))
+        # ten full pages, then an empty one
+        self.assertEqual(len(self.server.requests), 11)
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def test_order_kept(self):
+        self.assertEqual(list(prefetch(iter(xrange(100)), 4)), range(100))
+
+    def test_producer_error_reaches_consumer(self):
+        def produce():
+            for n in xrange(3):
+                yield n
+            raise ValueError('fetch failed')
+        consumed = []
+        with self.assertRaises(ValueError):
+            for item in prefetch(produce(), 2):
+                consumed.append(item)
+        self.assertEqual(consumed, [0, 1, 2])
@@ -0,0 +1,32 @@
+import unittest
+
+import corpus
+from phrases import MappedTrie, PhraseMatcher
+
+SLANGS = ['lol', 'gr8', 'fo sho', 'ayte', 'da', 'u']
+EMOTICONS = [':)', ':(', ':D', 'C:']
+TWEETS = ['lol da movie is gr8:):)', 'fo sho u ayte', 'ABC: :Do great :D',
+          'the very @someone http://t.co/x not good', ' ', '', 'fo sho:)lol']
+
+
+class PackedTrieTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = PhraseMatcher(SLANGS, EMOTICONS)
+
+    def test_mapped_finds_the_same(self):
+        mapped = PhraseMatcher.mapped(self.matcher.pack())
+        self.assertIsInstance(mapped.trie, MappedTrie)
+        for tweet in TWEETS + corpus.tweets(300):
+            self.assertEqual(mapped.find(tweet), self.matcher.find(tweet))
+            self.assertEqual(mapped.tokens(tweet), self.matcher.tokens(tweet))
+
+    def test_mapped_at_an_offset(self):
+        packed = self.matcher.pack()
+        mapped = PhraseMatcher.mapped('header' + packed + 'trailer', len('header'))
+        self.assertEqual(mapped.pack(), packed)
+        self.assertEqual(mapped.find('fo sho:)lol'), self.matcher.find('fo sho:)lol'))
+
+    def test_unicode_text(self):
+        mapped = PhraseMatcher.mapped(self.matcher.pack())
+        self.assertEqual(mapped.find(u'lol \u263a :)'), self.matcher.find(u'lol \u263a :)'))
@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+import Queue
+import threading
+import unittest
+
+import jsonrpclib
+from analyzer.corenlp import IdleQueue, StanfordCoreNLPPool, ThreadedJSONRPCServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_CORENLP = '%s %s' % (sys.executable,
+                          os.path.join(os.path.dirname(HERE), 'benchmarks', 'fake_corenlp.py'))
+
+
+class SplitBatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = StanfordCoreNLPPool(workers=2, command=FAKE_CORENLP)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_results_in_order(self):
+        texts = ['the movie was great', 'so bad', 'i love this phone']
+        results = self.pool.raw_parse_batch(texts)
+        self.assertEqual(len(results), len(texts))
+        for text, result in zip(texts, results):
+            self.assertEqual(result['sentences'][0]['text'], text)
+
+    def test_worker_error_is_raised(self):
+        def fail(texts):
+            raise RuntimeError('worker failed')
+        workers = [self.pool.idle.get() for _ in xrange(self.pool.size)]
+        for worker in workers:
+            worker.explode_batch = fail
+            self.pool.idle.put(worker)
+        try:
+            with self.assertRaises(RuntimeError):
+                self.pool._split_batch('explode_batch', ['a', 'b', 'c'])
+        finally:
+            for worker in workers:
+                del worker.explode_batch
+        # every worker went back to the pool
+        self.assertEqual(self.pool.idle.qsize(), self.pool.size)
+
+
+class ProbeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = StanfordCoreNLPPool(workers=2, max_queue=1, command=FAKE_CORENLP)
+        self.probed = []
+        for worker in list(self.pool.idle.queue):
+            worker.probe = self.recorder(worker)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def recorder(self, worker):
+        def probe(timeout):
+            self.probed.append(worker)
+            return True
+        return probe
+
+    def free_slots(self):
+        taken = 0
+        while self.pool.slots.acquire(False):
+            taken += 1
+        for i in xrange(taken):
+            self.pool.slots.release()
+        return taken
+
+    def test_probes_give_back_their_slot(self):
+        self.pool.probe()
+        self.assertEqual(len(self.probed), 2)
+        self.assertEqual(self.free_slots(), 3)
+        self.assertEqual(self.pool.idle.qsize(), 2)
+
+    def test_no_probe_without_a_free_slot(self):
+        for i in xrange(3):
+            self.pool.slots.acquire(False)
+        try:
+            self.pool.probe()
+        finally:
+            for i in xrange(3):
+                self.pool.slots.release()
+        self.assertEqual(self.probed, [])
+
+    def test_no_probe_while_requests_hold_the_workers(self):
+        workers = [self.pool.acquire() for _ in xrange(2)]
+        try:
+            self.pool.probe()
+            self.assertEqual(self.probed, [])
+            # the request waiting for a worker still has its slot
+            self.assertEqual(self.free_slots(), 1)
+        finally:
+            for worker in workers:
+                self.pool.release(worker)
+
+
+class IdleQueueTest(unittest.TestCase):
+
+    def test_put_wakes_the_oldest_get(self):
+        idle = IdleQueue()
+        got = []
+        def get(timeout):
+            got.append(idle.get(timeout=timeout))
+        threads = [threading.Thread(target=get, args=(timeout,)) for timeout in (30, None)]
+        for t in threads:
+            t.start()
+            while len(idle.waiters) < len(got) + threads.index(t) + 1:
+                time.sleep(0.001)
+        start = time.time()
+        idle.put('first')
+        threads[0].join()
+        # handed over, not picked up on the next poll
+        self.assertLess(time.time() - start, 0.02)
+        idle.put('second')
+        threads[1].join()
+        self.assertEqual(got, ['first', 'second'])
+        self.assertEqual(idle.qsize(), 0)
+
+    def test_timeout(self):
+        idle = IdleQueue()
+        start = time.time()
+        self.assertRaises(Queue.Empty, idle.get, timeout=0.1)
+        self.assertGreaterEqual(time.time() - start, 0.1)
+        self.assertRaises(Queue.Empty, idle.get, False)
+        self.assertEqual(len(idle.waiters), 0)
+        # what is put once a get gave up is kept for the next one
+        idle.put('worker')
+        self.assertEqual(idle.get(timeout=0.1), 'worker')
+
+
+class BatchRequestTest(unittest.TestCase):
+
+    def test_larger_than_the_queue(self):
+        pool = StanfordCoreNLPPool(workers=1, serving=True, max_queue=2, command=FAKE_CORENLP)
+        server = ThreadedJSONRPCServer(('127.0.0.1', 0), logRequests=False, batch_workers=1)
+        server.register_function(pool.sentiment)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            client = jsonrpclib.Server('http://127.0.0.1:%d' % server.server_address[1])
+            batch = jsonrpclib.MultiCall(client)
+            for n in xrange(10):
+                batch.sentiment('text %d' % n)
+            # every call answered, none busy
+            self.assertEqual(len(list(batch())), 10)
+        finally:
+            server.shutdown()
+            server.server_close()
+            pool.close()
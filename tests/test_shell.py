@@ -0,0 +1,45 @@
+import sys
+import unittest
+
+import fake_corenlp
+from analyzer.corenlp import StanfordCoreNLP
+
+FAKE_CORENLP = '%s %s --latency 0.2' % (sys.executable, fake_corenlp.__file__.replace('.pyc', '.py'))
+
+
+class FramingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.corenlp = StanfordCoreNLP(command=FAKE_CORENLP)
+        self.sent = []
+        sendline = self.corenlp.corenlp.sendline
+
+        def recording(line=''):
+            self.sent.append(line)
+            return sendline(line)
+        self.corenlp.corenlp.sendline = recording
+
+    def tearDown(self):
+        self.corenlp.close()
+
+    def text(self, result):
+        return ' '.join(sentence['text'] for sentence in result['sentences'])
+
+    def test_no_marker_while_in_step(self):
+        self.corenlp.raw_parse('the movie was great')
+        self.corenlp.raw_parse_batch(['so bad', 'i love this phone'])
+        self.corenlp.raw_parse('never again')
+        self.assertEqual(self.sent, ['the movie was great', 'so bad', 'i love this phone',
+                                     'never again'])
+
+    def test_marker_after_an_exchange_given_up_on(self):
+        # answered after the probe gave up, its output must not be taken
+        # for the next answer
+        self.assertFalse(self.corenlp.probe(timeout=0.05))
+        result = self.corenlp.raw_parse('the movie was great')
+        self.assertEqual(self.text(result), 'the movie was great')
+        self.assertEqual(len(self.sent), 3)
+        self.assertTrue(self.sent[1].startswith('frame'))
+        # and in step again after it
+        self.corenlp.raw_parse('so bad')
+        self.assertEqual(self.sent[3:], ['so bad'])
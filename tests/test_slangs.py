@@ -0,0 +1,228 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+import slangs
+from fake_noslang import FakeNoslang
+from normalizer import SlangTable, read_slangs_csv
+
+SERVED = {'afk': 'away from keyboard', 'asap': 'as soon as possible',
+          'brb': 'be right back', 'b4': 'before', '2day': 'today'}
+SLUGS = ['1', 'a', 'b']
+
+
+class Broken(dict):
+    ''' Slangs one of which cannot be written '''
+
+    def __getitem__(self, slang):
+        if slang == 'brb':
+            raise IOError('disk full')
+        return dict.__getitem__(self, slang)
+
+
+class RefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.served = os.path.join(self.tmp, 'served.csv')
+        self.csv = os.path.join(self.tmp, 'slangs_meaning.csv')
+        self.table = os.path.join(self.tmp, 'slangs_meaning.table')
+        self.snapshot = os.path.join(self.tmp, 'slangs_meaning.normalizer')
+        self.state = os.path.join(self.tmp, 'slangs_state.json')
+        self.serve(SERVED)
+        # on a page the fake does not serve, as if added by hand
+        slangs.write_csv({'zzz': 'sleeping'}, self.csv)
+        self.server = FakeNoslang(('127.0.0.1', 0), self.served)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.stop()
+        shutil.rmtree(self.tmp)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def serve(self, served):
+        slangs.write_csv(served, self.served)
+        # a new date, however soon after the last edit
+        mtime = os.path.getmtime(self.served)
+        os.utime(self.served, (mtime + 1, mtime + 1))
+
+    def refresh(self, base_url=None):
+        refresher = slangs.Refresher(base_url or self.server.base_url, 2, self.state,
+                                     timeout=5.0)
+        try:
+            return refresher.refresh(self.csv, self.table, self.snapshot, SLUGS)
+        finally:
+            refresher.close()
+
+    def read_state(self):
+        with open(self.state) as f:
+            return json.load(f)
+
+    def test_first_refresh(self):
+        counts, changed, errors = self.refresh()
+        self.assertEqual((counts, changed, errors), ((5, 0, 0), 3, {}))
+        expected = dict(SERVED, zzz='sleeping')
+        self.assertEqual(read_slangs_csv(self.csv), expected)
+        self.assertEqual(dict(SlangTable(self.table).iteritems()), expected)
+        self.assertEqual(sorted(self.read_state()), SLUGS)
+
+    def test_unchanged_pages_are_not_sent_again(self):
+        self.refresh()
+        csv = os.stat(self.csv)
+        table = os.stat(self.table)
+        self.assertEqual(self.refresh(), ((0, 0, 0), 0, {}))
+        self.assertEqual(self.server.not_modified, 3)
+        # nothing changed, nothing rewritten
+        for path, before in ((self.csv, csv), (self.table, table)):
+            after = os.stat(path)
+            self.assertEqual((after.st_ino, after.st_mtime), (before.st_ino, before.st_mtime))
+
+    def test_last_modified_alone(self):
+        self.refresh()
+        pages = slangs.load_state(self.state)
+        for page in pages.itervalues():
+            page['etag'] = None
+        slangs.save_state(pages, self.state)
+        self.assertEqual(self.refresh(), ((0, 0, 0), 0, {}))
+        self.assertEqual(self.server.not_modified, 3)
+
+    def test_edited_page_merges_only_its_changes(self):
+        self.refresh()
+        local = read_slangs_csv(self.csv)
+        local['afk'] = 'away from keys'
+        local['abc'] = 'easy'
+        slangs.write_csv(local, self.csv)
+        served = dict(SERVED, brb='be back soon', bff='best friends forever')
+        del served['b4']
+        self.serve(served)
+
+        counts, changed, errors = self.refresh()
+        self.assertEqual((counts, changed, errors), ((1, 1, 1), 1, {}))
+        self.assertEqual(self.server.not_modified, 2)
+        self.assertEqual(read_slangs_csv(self.csv), {
+            'afk': 'away from keys', 'abc': 'easy', 'asap': 'as soon as possible',
+            'brb': 'be back soon', 'bff': 'best friends forever', '2day': 'today',
+            'zzz': 'sleeping'})
+        self.assertEqual(SlangTable(self.table)['brb'], 'be back soon')
+
+    def test_failed_page_keeps_its_state(self):
+        self.refresh()
+        before = self.read_state()
+        # page b is gone and page a changed
+        self.serve({'afk': 'away from keyboard', 'asap': 'as soon as possible',
+                    'atm': 'at the moment', '2day': 'today'})
+
+        counts, changed, errors = self.refresh()
+        self.assertEqual((counts, changed, sorted(errors)), ((1, 0, 0), 1, ['b']))
+        after = self.read_state()
+        self.assertEqual(after['b'], before['b'])
+        self.assertEqual(after['1'], before['1'])
+        self.assertNotEqual(after['a'], before['a'])
+        self.assertEqual(read_slangs_csv(self.csv)['brb'], 'be right back')
+
+    def test_unreachable_dictionary_changes_nothing(self):
+        self.refresh()
+        with open(self.state) as f:
+            state = f.read()
+        with open(self.csv) as f:
+            csv = f.read()
+        base_url = self.server.base_url
+        self.stop()
+
+        counts, changed, errors = self.refresh(base_url)
+        self.assertEqual((counts, changed, sorted(errors)), ((0, 0, 0), 0, SLUGS))
+        with open(self.state) as f:
+            self.assertEqual(f.read(), state)
+        with open(self.csv) as f:
+            self.assertEqual(f.read(), csv)
+
+    def test_files_are_replaced_whole(self):
+        self.refresh()
+        # open while they are replaced, as by an analysis reading them
+        with open(self.csv) as csv:
+            before = csv.read()
+            with open(self.table) as table:
+                self.serve(dict(SERVED, atm='at the moment'))
+                self.assertEqual(self.refresh()[0], (1, 0, 0))
+                # renamed over rather than written in place
+                self.assertNotEqual(os.fstat(table.fileno()).st_ino, os.stat(self.table).st_ino)
+            self.assertNotEqual(os.fstat(csv.fileno()).st_ino, os.stat(self.csv).st_ino)
+            csv.seek(0)
+            self.assertEqual(csv.read(), before)
+        self.assertIn('atm', read_slangs_csv(self.csv))
+        self.assertEqual([name for name in os.listdir(self.tmp) if name.endswith('.tmp')], [])
+
+    def test_failed_write_leaves_the_csv(self):
+        self.refresh()
+        with open(self.csv) as f:
+            csv = f.read()
+        self.assertRaises(IOError, slangs.write_csv, Broken(SERVED), self.csv)
+        with open(self.csv) as f:
+            self.assertEqual(f.read(), csv)
+
+
+class MergeTest(unittest.TestCase):
+
+    def page(self, **found):
+        return {'etag': None, 'last_modified': None, 'slangs': sorted(found.items())}
+
+    def test_new_page(self):
+        local = {'zzz': 'sleeping'}
+        counts = slangs.merge(local, {}, {'a': self.page(afk='away from keyboard')})
+        self.assertEqual(counts, (1, 0, 0))
+        self.assertEqual(local, {'zzz': 'sleeping', 'afk': 'away from keyboard'})
+
+    def test_changes(self):
+        pages = {'a': self.page(afk='away from keyboard', asap='as soon as possible',
+                                atm='at the moment')}
+        local = {'afk': 'away from keyboard', 'asap': 'as soon as possible',
+                 'atm': 'at the moment', 'abc': 'easy'}
+        changed = {'a': self.page(afk='away from keys', atm='at the moment',
+                                  aka='also known as')}
+        self.assertEqual(slangs.merge(local, pages, changed), (1, 1, 1))
+        self.assertEqual(local, {'afk': 'away from keys', 'atm': 'at the moment',
+                                 'aka': 'also known as', 'abc': 'easy'})
+
+    def test_edited_by_hand_is_not_removed(self):
+        pages = {'a': self.page(afk='away from keyboard')}
+        local = {'afk': 'away from keys'}
+        self.assertEqual(slangs.merge(local, pages, {'a': self.page()}), (0, 0, 0))
+        self.assertEqual(local, {'afk': 'away from keys'})
+
+    def test_unchanged_pages_are_left_alone(self):
+        pages = {'a': self.page(afk='away from keyboard')}
+        local = {}
+        self.assertEqual(slangs.merge(local, pages, {}), (0, 0, 0))
+        self.assertEqual(local, {})
+
+
+class StateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'slangs_state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_missing(self):
+        self.assertEqual(slangs.load_state(self.path), {})
+
+    def test_round_trip(self):
+        pages = {'a': {'etag': '"1"', 'last_modified': 'Sat, 17 Oct 2026 10:00:00 GMT',
+                       'slangs': [('afk', 'away from keyboard'), ('\xc3\xa0', 'at')]}}
+        slangs.save_state(pages, self.path)
+        loaded = slangs.load_state(self.path)
+        self.assertEqual(loaded['a']['slangs'], pages['a']['slangs'])
+        self.assertIsInstance(loaded['a']['slangs'][0][0], str)
+        self.assertEqual(os.listdir(self.tmp), ['slangs_state.json'])